@@ -1,4 +1,6 @@
 __version__ = "0.1"
+from concurrent.futures import ThreadPoolExecutor
+import os
 from pathlib import Path
 import struct
 
@@ -135,17 +137,35 @@ def _fpa_size(datasize, Npts):
     fpasize = int(np.sqrt(fpasize))
     return fpasize
 
-def _reshape_tile(data, shape):
+def _wavenumber_slice(wavenumbers, wavenumber_range):
     """
-    Reshape and transpose FPA tile data
+    Slice of (increasing) wavenumbers within wavenumber_range (low, high)
     """
-    # Reshape ndarray
-    data = data[255:]
-    # Using shape attribute to raise error if a copy is made of the array
-    data.shape = shape
-    # Transpose to standard [ rows, columns, wavelengths ]
-    data = np.transpose(data, (1,2,0))
-    return data
+    if wavenumber_range is None:
+        return slice(0, len(wavenumbers))
+    low, high = min(wavenumber_range), max(wavenumber_range)
+    start = int(np.searchsorted(wavenumbers, low, side="left"))
+    stop = int(np.searchsorted(wavenumbers, high, side="right"))
+    return slice(start, max(start, stop))
+
+def _memmap_tile(p, Npts, fpasize, bands=None):
+    """
+    Memory-map FPA tile data (skipping the 255 block preamble)
+    and transpose it to [ rows, columns, wavelengths ]
+    Data is read from the file only when it is accessed.
+
+    Tiles are band sequential, so a slice of bands is a
+    contiguous part of the file and only it is mapped.
+    """
+    if bands is None:
+        bands = slice(0, Npts)
+    nbands = bands.stop - bands.start
+    if nbands == 0:
+        return np.zeros((fpasize, fpasize, 0), dtype=np.float32)
+    data = np.memmap(p.as_posix(), dtype=np.float32, mode='r',
+                     offset=(255 + bands.start * fpasize**2) * 4,
+                     shape=(nbands, fpasize, fpasize))
+    return np.transpose(data, (1,2,0))
 
 
 class DataObject(object):
@@ -172,10 +192,13 @@ class agilentImage(DataObject):
     Args:
         filename (str): full path to .seq file
         MAT (bool):     Output array using image coordinates (matplotlib/MATLAB)
+        wavenumber_range (tuple): (low, high) limits; only wavenumbers within
+                                  them are read
 
     Attributes:
         info (dict):            Dictionary of acquisition information
-        data (:obj:`ndarray`):  3-dimensional array (height x width x wavenumbers)
+        data (:obj:`ndarray`):  3-dimensional array (height x width x wavenumbers),
+                                memory-mapped from the .dat file
         wavenumbers (list):     Wavenumbers in order of .data array
         width (int):            Width of image in pixels (rows)
         height (int):           Width of image in pixels (columns)
@@ -186,11 +209,13 @@ class agilentImage(DataObject):
     https://bitbucket.org/AlexHenderson/agilent-file-formats
     """
 
-    def __init__(self, filename, MAT=False):
+    def __init__(self, filename, MAT=False, wavenumber_range=None):
         super().__init__()
         p = _check_files(filename, [".seq", ".dat", ".bsp"])
         self.MAT = MAT
         self._get_bsp_info(p)
+        self.bands = _wavenumber_slice(self.info['wavenumbers'], wavenumber_range)
+        self.info['wavenumbers'] = self.info['wavenumbers'][self.bands]
         self._get_dat(p)
 
         self.wavenumbers = self.info['wavenumbers']
@@ -207,10 +232,8 @@ class agilentImage(DataObject):
 
     def _get_dat(self, p_in):
         p = p_in.with_suffix(".dat")
-        with p.open(mode='rb') as f:
-            data = np.fromfile(f, dtype=np.float32)
-        fpasize = _fpa_size(data.size, self.info['Npts'])
-        data = _reshape_tile(data, (self.info['Npts'], fpasize, fpasize))
+        fpasize = _fpa_size(p.stat().st_size / 4, self.info['Npts'])
+        data = _memmap_tile(p, self.info['Npts'], fpasize, self.bands)
 
         if self.MAT:
             # Rotate and flip tile to match matplotlib/MATLAB image coordinates
@@ -231,10 +254,17 @@ class agilentMosaic(DataObject):
     Args:
         filename (str): full path to .dms file
         MAT (bool):     Output array using image coordinates (matplotlib/MATLAB)
+        wavenumber_range (tuple): (low, high) limits; only wavenumbers within
+                                  them are read
 
     Attributes:
         info (dict):            Dictionary of acquisition information
-        data (:obj:`ndarray`):  3-dimensional array (height x width x wavenumbers)
+        data (:obj:`ndarray`):  3-dimensional array (height x width x wavenumbers),
+                                assembled from .tiles on first access; this
+                                reads all tiles into memory, use read_region
+                                to read only a part
+        tiles (list):           Memory-mapped tiles in image order (rows of columns),
+                                opened on first access
         wavenumbers (list):     Wavenumbers in order of .data array
         width (int):            Width of mosaic in pixels (rows)
         height (int):           Width of mosaic in pixels (columns)
@@ -245,16 +275,19 @@ class agilentMosaic(DataObject):
     https://bitbucket.org/AlexHenderson/agilent-file-formats
     """
 
-    def __init__(self, filename, MAT=False):
+    def __init__(self, filename, MAT=False, wavenumber_range=None):
         super().__init__()
         p = _check_files(filename, [".dms", ".dmt", ".drd", ".dmd"])
         self.MAT = MAT
         self._get_dmt_info(p)
+        self.bands = _wavenumber_slice(self.info['wavenumbers'], wavenumber_range)
+        self.info['wavenumbers'] = self.info['wavenumbers'][self.bands]
         self._get_dmd(p)
+        self.data = None  # assembled from tiles when accessed
 
         self.wavenumbers = self.info['wavenumbers']
-        self.width = self.data.shape[0]
-        self.height = self.data.shape[1]
+        self.width = len(self._tile_paths) * self.fpasize
+        self.height = len(self._tile_paths[0]) * self.fpasize
         self.filename = p.with_suffix(".dms").as_posix()
         self.acqdate = self.info['Time Stamp']
 
@@ -275,32 +308,98 @@ class agilentMosaic(DataObject):
         p = p_in.parent.joinpath(p_in.stem + "_0000_0000.dmd")
         Npts = self.info['Npts']
         fpasize = _fpa_size(p.stat().st_size / 4, Npts)
-        # Allocate array
-        # (rows, columns, wavenumbers)
-        data = np.zeros((ytiles*fpasize, xtiles*fpasize, Npts),
-                        dtype=np.float32)
 
         if DEBUG:
             print("{0} x {1} tiles found".format(xtiles, ytiles))
             print("FPA size is {}".format(fpasize))
             print("Total dimensions are {0} x {1} or {2} spectra.".format(
                 xtiles*fpasize, ytiles*fpasize, xtiles*ytiles*fpasize**2))
-            print(data.shape)
 
+        # Tile files in image order: tile_paths[row][column]
+        tile_paths = [[None] * xtiles for _ in range(ytiles)]
         for y in range(ytiles):
             for x in range(xtiles):
                 p_dmd = p_in.parent.joinpath(p_in.stem + "_{0:04d}_{1:04d}.dmd".format(x,y))
-                with p_dmd.open(mode='rb') as f:
-                    tile = np.fromfile(f, dtype=np.float32)
-                tile = _reshape_tile(tile, (Npts, fpasize, fpasize))
                 if self.MAT:
-                    # Rotate and flip tile to match matplotlib/MATLAB image coordinates
-                    tile = np.flipud(tile)
-                    data[y*fpasize:(y+1)*fpasize, x*fpasize:(x+1)*fpasize, :] = tile
+                    tile_paths[y][x] = p_dmd
                 else:
                     # Tile data is in normal cartesian coordinates
                     # but tile numbering (000x_000y)
                     # is left-to-right, top-to-bottom (image coordinates)
-                    data[(ytiles-y-1)*fpasize:(ytiles-y)*fpasize, (x)*fpasize:(x+1)*fpasize, :] = tile
+                    tile_paths[ytiles-y-1][x] = p_dmd
 
-        self.data = data
+        self._tile_paths = tile_paths
+        self._tiles = None
+        self.fpasize = fpasize
+
+    def _open_tile(self, row, column):
+        """ Memory-map a tile given its position in the image """
+        tile = _memmap_tile(self._tile_paths[row][column], self.info['Npts'],
+                            self.fpasize, self.bands)
+        if self.MAT:
+            # Rotate and flip tile to match matplotlib/MATLAB image coordinates
+            tile = np.flipud(tile)
+        return tile
+
+    @property
+    def tiles(self):
+        if self._tiles is None:
+            self._tiles = [[self._open_tile(y, x) for x in range(len(row))]
+                           for y, row in enumerate(self._tile_paths)]
+        return self._tiles
+
+    @property
+    def data(self):
+        """
+        Mosaic (rows, columns, wavenumbers) assembled from the
+        memory-mapped tiles on first access into a new float32 array.
+        """
+        if self._data is None:
+            self._data = self._assemble()
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+
+    def _assemble(self):
+        return self.read_region((0, self.width), (0, self.height))
+
+    def read_region(self, rows, columns, n_jobs=None, dtype=np.float32):
+        """
+        Read a region of interest (rows, columns, wavenumbers) of the mosaic.
+        Only tiles that intersect the region are read, in parallel threads,
+        and they are copied directly into the returned array.
+
+        Args:
+            rows (tuple):    (start, stop) rows in pixels
+            columns (tuple): (start, stop) columns in pixels
+            n_jobs (int):    number of threads (default: a thread per tile,
+                             but at most the number of CPUs)
+            dtype:           dtype of the returned array
+
+        Returns:
+            :obj:`ndarray` of the region (clipped to the mosaic)
+        """
+        fpasize = self.fpasize
+        r0, r1 = max(0, rows[0]), min(self.width, rows[1])
+        c0, c1 = max(0, columns[0]), min(self.height, columns[1])
+        r1, c1 = max(r0, r1), max(c0, c1)
+        data = np.empty((r1 - r0, c1 - c0, len(self.wavenumbers)), dtype=dtype)
+
+        def read_tile(tr, tc):
+            # intersection of the tile and the region in mosaic pixels
+            ys = max(r0, tr*fpasize), min(r1, (tr+1)*fpasize)
+            xs = max(c0, tc*fpasize), min(c1, (tc+1)*fpasize)
+            tile = self._open_tile(tr, tc)
+            data[ys[0]-r0:ys[1]-r0, xs[0]-c0:xs[1]-c0] = \
+                tile[ys[0]-tr*fpasize:ys[1]-tr*fpasize, xs[0]-tc*fpasize:xs[1]-tc*fpasize]
+
+        tiles = [(tr, tc)
+                 for tr in range(r0 // fpasize, (r1 + fpasize - 1) // fpasize)
+                 for tc in range(c0 // fpasize, (c1 + fpasize - 1) // fpasize)]
+        n_jobs = n_jobs or max(1, min(len(tiles), os.cpu_count() or 1))
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            for _ in executor.map(lambda t: read_tile(*t), tiles):
+                pass  # raise exceptions from threads
+        return data
@@ -1,5 +1,5 @@
-import itertools
 import struct
+import weakref
 from functools import reduce
 from _collections import defaultdict
 
@@ -10,16 +10,51 @@ from Orange.data import \
     ContinuousVariable, StringVariable, TimeVariable, Domain, Table
 from Orange.data.io import FileFormat
 import Orange.data.io
-from scipy.interpolate import interp1d
 from scipy.io import matlab
 import numbers
 
+from . import readcache
 from .pymca5 import OmnicMap
 from .agilent import agilentImage, agilentMosaic
 
 
+def _table_with_spectra(domain, X, source):
+    """
+    A table with the given domain, spectra X and other columns (class_vars
+    and metas are the same as in source.domain) and ids from source.
+    X is used as is: Orange's constructors would convert it to float64.
+    """
+    empty = Orange.data.Domain([], source.domain.class_vars, source.domain.metas)
+    table = Orange.data.Table.from_numpy(empty, np.zeros((len(X), 0)), source.Y,
+                                         source.metas, source.W)
+    table.domain = domain
+    table.X = X
+    table.ids = np.array(source.ids)
+    table.name = getattr(source, "name", table.name)
+    table.attributes = getattr(source, "attributes", {})
+    return table
+
+
 class SpectralFileFormat:
 
+    def __init__(self, filename, wavenumber_range=None, dtype=np.float64):
+        """
+        Args:
+            filename (str): name of the file to open
+            wavenumber_range (tuple): optional (low, high) wavenumber limits;
+                   readers that support it (ENVI, Agilent) only read bands
+                   within them
+            dtype: dtype of spectra; Orange assumes X to be float64, float32
+                   (half the memory of large hyperspectral images) is opt-in
+                   and kept by the preprocessors
+        """
+        super().__init__(filename)
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError("Spectra can only be read as float32 or float64")
+        self.wavenumber_range = wavenumber_range
+        self.dtype = dtype
+
     def read_spectra(self):
         """ Fast reading of spectra. Return spectral information
         in two arrays (wavelengths and values). Only additional
@@ -34,18 +69,17 @@ class SpectralFileFormat:
 
     def read(self):
         domvals, data, additional_table = self.read_spectra()
-        data = np.asarray(data, dtype=np.float64)  # Orange assumes X to be float64
+        data = np.asarray(data, dtype=self.dtype)  # Orange assumes float64 unless opted out
+        if not data.flags.writeable:  # a view into a read-only file
+            data = data.copy()
         features = [Orange.data.ContinuousVariable.make("%f" % f) for f in domvals]
         if additional_table is None:
-            domain = Orange.data.Domain(features, None)
-            return Orange.data.Table(domain, data)
-        else:
-            domain = Orange.data.Domain(features,
-                                        class_vars=additional_table.domain.class_vars,
-                                        metas=additional_table.domain.metas)
-            ret_data = additional_table.transform(domain)
-            ret_data.X = data
-            return ret_data
+            additional_table = Orange.data.Table.from_numpy(
+                Orange.data.Domain([]), np.zeros((len(data), 0)))
+        domain = Orange.data.Domain(features,
+                                    class_vars=additional_table.domain.class_vars,
+                                    metas=additional_table.domain.metas)
+        return _table_with_spectra(domain, data, additional_table)
 
 
 class DatReader(FileFormat):
@@ -53,7 +87,9 @@ class DatReader(FileFormat):
     contains the wavelengths, the others contain the spectra. """
     EXTENSIONS = ('.dat', '.dpt', '.xy',)
     DESCRIPTION = 'Spectra ASCII'
+    CACHE_VERSION = 1
 
+    @readcache.cached
     def read(self):
         tbl = np.loadtxt(self.filename, ndmin=2)
         domvals = tbl.T[0]  # first column is attribute name
@@ -77,7 +113,9 @@ class AsciiMapReader(FileFormat):
     coordinates: http://www.cytospec.com/file.php#FileASCII3 """
     EXTENSIONS = ('.xyz',)
     DESCRIPTION = 'Hyperspectral map ASCII'
+    CACHE_VERSION = 1
 
+    @readcache.cached
     def read(self):
         with open(self.filename, "rb") as f:
             # read first row separately because of two empty columns
@@ -110,38 +148,41 @@ class AsciiMapReader(FileFormat):
             np.savetxt(f, data.X, delimiter="\t", fmt="%g")
 
 
-def _spectra_from_image(X, features, x_locs, y_locs):
+def _band_subset(features, wavenumber_range):
+    """ Indices of features within wavenumber_range (a slice if they are
+    consecutive, so that arrays can be subset without copying) """
+    if wavenumber_range is None:
+        return slice(None)
+    low, high = min(wavenumber_range), max(wavenumber_range)
+    inside = np.flatnonzero((features >= low) & (features <= high))
+    if len(inside) and np.all(np.diff(inside) == 1):
+        return slice(inside[0], inside[-1] + 1)
+    return inside
+
+
+def _spectra_from_image(X, features, x_locs, y_locs, dtype=np.float32):
     """
     Create a spectral format (returned by SpectralFileFormat.read_spectra)
     from 3D image organized [ rows, columns, wavelengths ]
     """
-    spectra = np.zeros((X.shape[0]*X.shape[1], X.shape[2]), dtype=np.float32)
-    metadata = []
-
-    cs = 0
-    for ir, row in enumerate(X):
-        for ic, column in enumerate(row):
-            spectra[cs] = column
-            cs += 1
-            if x_locs is not None and y_locs is not None:
-                x = x_locs[ic]
-                y = y_locs[ir]
-                metadata.append({"map_x": x, "map_y": y})
-            else:
-                metadata.append({})
-
-    metakeys = sorted(set(itertools.chain.from_iterable(metadata)))
-    metas = []
-    for mk in metakeys:
-        if mk in ["map_x", "map_y"]:
-            metas.append(Orange.data.ContinuousVariable.make(mk))
-        else:
-            metas.append(Orange.data.StringVariable.make(mk))
+    X = np.asarray(X)
+    rows, columns = X.shape[0], X.shape[1]
+    # a view for contiguous images of dtype, otherwise a single copy
+    spectra = np.ascontiguousarray(X, dtype=dtype).reshape((rows*columns, X.shape[2]))
+
+    if x_locs is not None and y_locs is not None:
+        metas = [Orange.data.ContinuousVariable.make("map_x"),
+                 Orange.data.ContinuousVariable.make("map_y")]
+        # pixels are ordered by rows
+        meta_values = np.column_stack((np.tile(np.asarray(x_locs, dtype=float), rows),
+                                       np.repeat(np.asarray(y_locs, dtype=float), columns)))
+    else:
+        metas = []
+        meta_values = np.zeros((len(spectra), 0))
 
     domain = Orange.data.Domain([], None, metas=metas)
-    metas = np.array([[row[ma.name] for ma in metas]
-                      for row in metadata], dtype=object)
-    data = Orange.data.Table.from_numpy(domain, X=np.zeros((len(spectra), 0)), metas=metas)
+    data = Orange.data.Table.from_numpy(domain, X=np.zeros((len(spectra), 0)),
+                                        metas=meta_values)
 
     return features, spectra, data
 
@@ -149,9 +190,11 @@ def _spectra_from_image(X, features, x_locs, y_locs):
 class MatlabReader(FileFormat):
     EXTENSIONS = ('.mat',)
     DESCRIPTION = "Matlab"
+    CACHE_VERSION = 1
 
     # Matlab 7.3+ files are not handled by scipy reader
 
+    @readcache.cached
     def read(self):
         who = matlab.whosmat(self.filename)
         if not who:
@@ -215,13 +258,18 @@ class MatlabReader(FileFormat):
             return Orange.data.Table.from_numpy(domain, X, Y=None, metas=metadata)
 
 
-class EnviMapReader(FileFormat, SpectralFileFormat):
+class EnviMapReader(SpectralFileFormat, FileFormat):
     EXTENSIONS = ('.hdr',)
     DESCRIPTION = 'Envi'
 
     def read_spectra(self):
         a = spectral.io.envi.open(self.filename)
-        X = np.array(a.load())
+        if a.using_memmap:
+            # a [rows, columns, bands] view of the file in any interleave; only
+            # the selected bands are read when spectra are copied from it
+            X = a.open_memmap(interleave="bip")
+        else:
+            X = np.asarray(a.load())
         try:
             lv = a.metadata["wavelength"]
             features = np.array(list(map(float, lv)))
@@ -229,13 +277,17 @@ class EnviMapReader(FileFormat, SpectralFileFormat):
             #just start counting from 0 when nothing is known
             features = np.arange(X.shape[-1])
 
+        bands = _band_subset(features, self.wavenumber_range)
+        features, X = features[bands], X[:, :, bands]
+
         x_locs = np.arange(X.shape[1])
         y_locs = np.arange(X.shape[0])
 
-        return _spectra_from_image(X, features, x_locs, y_locs)
+        # copy from the file directly into the output dtype
+        return _spectra_from_image(X, features, x_locs, y_locs, dtype=self.dtype)
 
 
-class HDF5Reader_HERMES(FileFormat, SpectralFileFormat):
+class HDF5Reader_HERMES(SpectralFileFormat, FileFormat):
     """ A very case specific reader for HDF5 files from the HEREMES beamline in SOLEIL"""
     EXTENSIONS = ('.hdf5',)
     DESCRIPTION = 'HDF5 file @HERMRES/SOLEIL'
@@ -251,11 +303,13 @@ class HDF5Reader_HERMES(FileFormat, SpectralFileFormat):
         return _spectra_from_image(intensities, energy, x_locs, y_locs)
 
 
-class OmnicMapReader(FileFormat, SpectralFileFormat):
+class OmnicMapReader(SpectralFileFormat, FileFormat):
     """ Reader for files with two columns of numbers (X and Y)"""
     EXTENSIONS = ('.map',)
     DESCRIPTION = 'Omnic map'
+    CACHE_VERSION = 2
 
+    @readcache.cached
     def read_spectra(self):
         om = OmnicMap.OmnicMap(self.filename)
         info = om.info
@@ -283,13 +337,13 @@ class OmnicMapReader(FileFormat, SpectralFileFormat):
         return _spectra_from_image(X, features, x_locs, y_locs)
 
 
-class AgilentImageReader(FileFormat, SpectralFileFormat):
+class AgilentImageReader(SpectralFileFormat, FileFormat):
     """ Reader for Agilent FPA single tile image files"""
     EXTENSIONS = ('.seq',)
     DESCRIPTION = 'Agilent Single Tile Image'
 
     def read_spectra(self):
-        ai = agilentImage(self.filename)
+        ai = agilentImage(self.filename, wavenumber_range=self.wavenumber_range)
         info = ai.info
         X = ai.data
 
@@ -307,40 +361,70 @@ class AgilentImageReader(FileFormat, SpectralFileFormat):
         x_locs = np.linspace(0, X.shape[1]*px_size, num=X.shape[1], endpoint=False)
         y_locs = np.linspace(0, X.shape[0]*px_size, num=X.shape[0], endpoint=False)
 
-        return _spectra_from_image(X, features, x_locs, y_locs)
+        # copy from the memory-mapped tile directly into the output dtype
+        return _spectra_from_image(X, features, x_locs, y_locs, dtype=self.dtype)
+
 
+def _range_indices(locs, limits):
+    """ (start, stop) indices of sorted locs within limits; (0, 0) if none are """
+    inside = np.flatnonzero((locs >= min(limits)) & (locs <= max(limits)))
+    return (inside[0], inside[-1] + 1) if len(inside) else (0, 0)
 
-class agilentMosaicReader(FileFormat, SpectralFileFormat):
+
+class agilentMosaicReader(SpectralFileFormat, FileFormat):
     """ Reader for Agilent FPA mosaic image files"""
     EXTENSIONS = ('.dms',)
     DESCRIPTION = 'Agilent Mosaic Image'
 
+    def __init__(self, filename, roi=None, **kwargs):
+        """
+        Args:
+            roi (tuple): optional region of interest (x_min, x_max, y_min, y_max)
+                   in map_x and map_y units; only pixels within it are read, from
+                   the tiles that intersect it. A region that misses the map
+                   gives a table without rows.
+            Other arguments are as for SpectralFileFormat.
+        """
+        super().__init__(filename, **kwargs)
+        self.roi = roi
+
     def read_spectra(self):
-        am = agilentMosaic(self.filename)
+        am = agilentMosaic(self.filename, wavenumber_range=self.wavenumber_range)
         info = am.info
-        X = am.data
 
         try:
             features = info['wavenumbers']
         except KeyError:
             #just start counting from 0 when nothing is known
-            features = np.arange(X.shape[-1])
+            features = np.arange(len(am.wavenumbers))
 
         try:
             px_size = info['FPA Pixel Size'] * info['PixelAggregationSize']
         except KeyError:
             # Use pixel units if FPA Pixel Size is not known
             px_size = 1
-        x_locs = np.linspace(0, X.shape[1]*px_size, num=X.shape[1], endpoint=False)
-        y_locs = np.linspace(0, X.shape[0]*px_size, num=X.shape[0], endpoint=False)
+        x_locs = np.linspace(0, am.height*px_size, num=am.height, endpoint=False)
+        y_locs = np.linspace(0, am.width*px_size, num=am.width, endpoint=False)
 
-        return _spectra_from_image(X, features, x_locs, y_locs)
+        if self.roi is None:
+            rows, columns = (0, am.width), (0, am.height)
+        else:
+            x_min, x_max, y_min, y_max = self.roi
+            columns = _range_indices(x_locs, (x_min, x_max))
+            rows = _range_indices(y_locs, (y_min, y_max))
+            x_locs, y_locs = x_locs[slice(*columns)], y_locs[slice(*rows)]
+        # tiles are copied once, directly into the final spectra array
+        X = am.read_region(rows, columns, dtype=self.dtype)
+
+        return _spectra_from_image(X, features, x_locs, y_locs, dtype=self.dtype)
 
 
 class SPCReader(FileFormat):
     EXTENSIONS = ('.spc', '.SPC',)
     DESCRIPTION = 'Galactic SPC format'
+    CACHE_VERSION = 1
 
+    @readcache.cached
     def read(self):
         try:
             import spc
@@ -383,6 +467,33 @@ class SPCReader(FileFormat):
         return Orange.data.Table.from_numpy(domain, y_data)
 
 
+def _opus_image(data_3D, mapX, mapY):
+    """ Spectra of an OPUS image as rows (a view if possible)
+    and their (map_x, map_y) coordinates """
+    y_data = data_3D.reshape(-1, data_3D.shape[-1])
+    map_x, map_y = np.meshgrid(mapX, mapY)
+    return y_data, np.column_stack((map_x.ravel(), map_y.ravel()))
+
+
+def _opus_regions(regions, start_time):
+    """ Spectra of OPUS map regions and their (map_x, map_y, map_region
+    and, optionally, start_time) in preallocated arrays """
+    n = sum(len(region.spectra) for region in regions)
+    y_data = np.empty((n, regions[0].spectra.shape[1]))
+    meta_data = np.empty((n, 4 if start_time else 3), dtype=object)
+    pos = 0
+    for region in regions:
+        rows = slice(pos, pos + len(region.spectra))
+        y_data[rows] = region.spectra
+        meta_data[rows, 0] = region.mapX
+        meta_data[rows, 1] = region.mapY
+        meta_data[rows, 2] = region.title
+        if start_time:
+            meta_data[rows, 3] = region.start_time
+        pos = rows.stop
+    return y_data, meta_data
+
+
 class OPUSReader(FileFormat):
     """Reader for OPUS files"""
 
@@ -392,6 +503,7 @@ class OPUSReader(FileFormat):
             (".0*", ".1*", ".2*", ".3*", ".4*", ".5*", ".6*", ".7*", ".8*", ".9*")
 
     DESCRIPTION = 'OPUS Spectrum'
+    CACHE_VERSION = 1
 
     @property
     def sheets(self):
@@ -401,6 +513,7 @@ class OPUSReader(FileFormat):
             dbs.append(db[0] + " " + db[1] + " " + db[2])
         return dbs
 
+    @readcache.cached
     def read(self):
         import opusFC
 
@@ -426,57 +539,25 @@ class OPUSReader(FileFormat):
         meta_data = None
 
         if type(data) == opusFC.MultiRegionDataReturn:
-            y_data = []
-            meta_data = []
             metas.extend([ContinuousVariable.make('map_x'),
                           ContinuousVariable.make('map_y'),
                           StringVariable.make('map_region'),
                           TimeVariable.make('start_time')])
-            for region in data.regions:
-                y_data.append(region.spectra)
-                mapX = region.mapX
-                mapY = region.mapY
-                map_region = np.full_like(mapX, region.title, dtype=object)
-                start_time = region.start_time
-                meta_region = np.column_stack((mapX, mapY,
-                                               map_region, start_time))
-                meta_data.append(meta_region.astype(object))
-            y_data = np.vstack(y_data)
-            meta_data = np.vstack(meta_data)
+            y_data, meta_data = _opus_regions(data.regions, start_time=True)
 
         elif type(data) == opusFC.MultiRegionTRCDataReturn:
-            y_data = []
-            meta_data = []
             metas.extend([ContinuousVariable.make('map_x'),
                           ContinuousVariable.make('map_y'),
                           StringVariable.make('map_region')])
             attrs = [ContinuousVariable.make(repr(data.labels[i]))
                         for i in range(len(data.labels))]
-            for region in data.regions:
-                y_data.append(region.spectra)
-                mapX = region.mapX
-                mapY = region.mapY
-                map_region = np.full_like(mapX, region.title, dtype=object)
-                meta_region = np.column_stack((mapX, mapY, map_region))
-                meta_data.append(meta_region.astype(object))
-            y_data = np.vstack(y_data)
-            meta_data = np.vstack(meta_data)
+            y_data, meta_data = _opus_regions(data.regions, start_time=False)
 
         elif type(data) == opusFC.ImageDataReturn:
             metas.extend([ContinuousVariable.make('map_x'),
                           ContinuousVariable.make('map_y')])
 
-            data_3D = data.spectra
-
-            for i in np.ndindex(data_3D.shape[:1]):
-                map_y = np.full_like(data.mapX, data.mapY[i])
-                coord = np.column_stack((data.mapX, map_y))
-                if y_data is None:
-                    y_data = data_3D[i]
-                    meta_data = coord.astype(object)
-                else:
-                    y_data = np.vstack((y_data, data_3D[i]))
-                    meta_data = np.vstack((meta_data, coord))
+            y_data, meta_data = _opus_image(data.spectra, data.mapX, data.mapY)
 
         elif type(data) == opusFC.ImageTRCDataReturn:
             metas.extend([ContinuousVariable.make('map_x'),
@@ -484,17 +565,7 @@ class OPUSReader(FileFormat):
 
             attrs = [ContinuousVariable.make(repr(data.labels[i]))
                         for i in range(len(data.labels))]
-            data_3D = data.traces
-
-            for i in np.ndindex(data_3D.shape[:1]):
-                map_y = np.full_like(data.mapX, data.mapY[i])
-                coord = np.column_stack((data.mapX, map_y))
-                if y_data is None:
-                    y_data = data_3D[i]
-                    meta_data = coord.astype(object)
-                else:
-                    y_data = np.vstack((y_data, data_3D[i]))
-                    meta_data = np.vstack((meta_data, coord))
+            y_data, meta_data = _opus_image(data.traces, data.mapX, data.mapY)
 
         elif type(data) == opusFC.TimeResolvedTRCDataReturn:
             y_data = data.traces
@@ -543,18 +614,20 @@ class OPUSReader(FileFormat):
 
         meta_data = np.atleast_2d(meta_data)
 
+        # copies only if opusFC data are not contiguous float64
         table = Orange.data.Table.from_numpy(domain,
-                                             y_data.astype(float, order='C'),
+                                             np.asarray(y_data, dtype=float, order='C'),
                                              metas=meta_data)
 
         return table
 
 
-class SPAReader(FileFormat, SpectralFileFormat):
+class SPAReader(SpectralFileFormat, FileFormat):
     #based on code by Zack Gainsforth
 
     EXTENSIONS = (".spa", ".SPA", ".srs")
     DESCRIPTION = 'SPA'
+    CACHE_VERSION = 1
 
     saved_sections = None
     type = None
@@ -595,6 +668,7 @@ class SPAReader(FileFormat, SpectralFileFormat):
             dataType, numPoints, xUnits, yUnits, firstX, lastX, noise = struct.unpack('<iiiifff', f.read(28))
             return numPoints, firstX, lastX,
 
+    @readcache.cached
     def read_spectra(self):
 
         self.sections()
@@ -625,7 +699,9 @@ class GSFReader(FileFormat):
 
     EXTENSIONS = (".gsf",)
     DESCRIPTION = 'Gwyddion Simple Field'
+    CACHE_VERSION = 1
 
+    @readcache.cached
     def read(self):
         with open(self.filename, "rb") as f:
             #print(f.readline())
@@ -673,11 +749,42 @@ class GSFReader(FileFormat):
             return data
 
 
+def _interp_rows(xp, fp, x):
+    """
+    Linear interpolation (as scipy's interp1d) of all rows at once. Channels
+    fp[i] (channels x points) are known at unsorted xp[i] and are
+    interpolated to common points x.
+    """
+    n, m = xp.shape[1], len(x)
+    sorter = np.argsort(xp, axis=1)
+    xp = np.take_along_axis(xp, sorter, axis=1)
+    fp = np.take_along_axis(fp, sorter[:, None, :], axis=2)
+    # searchsorted(xp[i], x) for every row: sort new and known points together
+    # (stable, so that new points come first on ties) and count known
+    # points before every new one
+    merged = np.concatenate((np.broadcast_to(x, (len(xp), m)), xp), axis=1)
+    order = np.argsort(merged, axis=1, kind="stable")
+    known_before = np.cumsum(order >= m, axis=1)
+    new = order < m
+    indices = np.empty((len(xp), m), dtype=int)
+    indices[np.nonzero(new)[0], order[new]] = known_before[new]
+    hi = np.clip(indices, 1, n - 1)
+    lo = hi - 1
+    x_lo = np.take_along_axis(xp, lo, axis=1)
+    x_hi = np.take_along_axis(xp, hi, axis=1)
+    y_lo = np.take_along_axis(fp, lo[:, None, :], axis=2)
+    y_hi = np.take_along_axis(fp, hi[:, None, :], axis=2)
+    slope = (y_hi - y_lo) / (x_hi - x_lo)[:, None, :]
+    return slope * (x - x_lo)[:, None, :] + y_lo
+
+
 class NeaReader(FileFormat):
 
     EXTENSIONS = (".nea", ".txt")
     DESCRIPTION = 'NeaSPEC'
+    CACHE_VERSION = 2
 
+    @readcache.cached
     def read(self):
 
         with open(self.filename, "rt") as f:
@@ -689,98 +796,70 @@ class NeaReader(FileFormat):
 
             f.seek(0)
             next(f)
-            datacols = np.arange(4, ncols)
-            data = np.loadtxt(f, dtype="float", usecols=datacols)
-
-            f.seek(0)
-            next(f)
-            metacols = np.arange(0, 4)
-            meta = np.loadtxt(f,
-                              dtype={'names': ('row', 'column', 'run', 'channel'),
-                                     'formats': (np.int, np.int, np.int, "S10")},
-                              usecols=metacols)
-
-            # ASSUMTION: runs start with 0
-            runs = np.unique(meta["run"])
-
-            # ASSUMPTION: there is one M channel and multiple O?A and O?P channels,
-            # both with the same number, both starting with 0
-            channels = np.unique(meta["channel"])
-            maxn = -1
-
-            def channel_type(a):
-                if a.startswith(b"O") and a.endswith(b"A"):
-                    return "OA"
-                elif a.startswith(b"O") and a.endswith(b"P"):
-                    return "OP"
-                else:
-                    return "M"
-
-            for a in channels:
-                if channel_type(a) in ("OA", "OP"):
-                    maxn = max(maxn, int(a[1:-1]))
-            numharmonics = maxn+1
-
-            rowcols = np.vstack((meta["row"], meta["column"])).T
-            uniquerc = set(map(tuple, rowcols))
-
-            di = {}  # dictionary of indices for each row and column
-
-            min_intp, max_intp = None, None
-
-
-            for i, (row, col, run, chan) in enumerate(meta):
-                if (row, col) not in di:
-                    di[(row, col)] = \
-                        {"M": np.zeros((len(runs), len(datacols))) * np.nan,
-                         "OA": np.zeros((numharmonics, len(runs), len(datacols))) * np.nan,
-                         "OP": np.zeros((numharmonics, len(runs), len(datacols))) * np.nan}
-                if channel_type(chan) == "M":
-                    di[(row, col)][channel_type(chan)][run] = data[i]
-                    if min_intp is None:  # we need the limits of common X for all
-                        min_intp = np.min(data[i])
-                        max_intp = np.max(data[i])
-                    else:
-                        min_intp = max(min_intp, np.min(data[i]))
-                        max_intp = min(max_intp, np.max(data[i]))
-                elif channel_type(chan) in ("OA", "OP"):
-                    di[(row, col)][channel_type(chan)][int(chan[1:-1]), run] = data[i]
-
-            X = np.linspace(min_intp, max_intp, num=len(datacols))
-
-            final_metas = []
-            final_data = []
-
-            for row, col in uniquerc:
-                cur = di[(row, col)]
-                M, OA, OP = cur["M"], cur["OA"], cur["OP"]
-
-                OAn = np.zeros(OA.shape) * np.nan
-                OPn = np.zeros(OA.shape) * np.nan
-                for run in range(len(M)):
-                    f = interp1d(M[run], OA[:, run])
-                    OAn[:, run] = f(X)
-                    f = interp1d(M[run], OP[:, run])
-                    OPn[:, run] = f(X)
-
-                OAmean = np.mean(OAn, axis=1)
-                OPmean = np.mean(OPn, axis=1)
-                final_data.append(OAmean)
-                final_data.append(OPmean)
-                final_metas += [[row, col, "O%dA" % i] for i in range(numharmonics)]
-                final_metas += [[row, col, "O%dP" % i] for i in range(numharmonics)]
-
-            final_data = np.vstack(final_data)
-
-            metas = [Orange.data.ContinuousVariable.make("row"),
-                     Orange.data.ContinuousVariable.make("column"),
-                     Orange.data.StringVariable.make("channel")]
-
-            domain = Orange.data.Domain(
-                [Orange.data.ContinuousVariable.make("%f" % f) for f in X],
-                None, metas=metas)
-            final_metas = np.array(final_metas, dtype=object)
-            return Orange.data.Table(domain, final_data, metas=final_metas)
+            lines = np.loadtxt(f, ndmin=1,
+                               dtype=[("row", int), ("column", int), ("run", int),
+                                      ("channel", "S10"), ("data", float, (ncols - 4,))])
+        data = lines["data"]
+        npoints = data.shape[1]
+
+        # ASSUMPTION: there is one M channel and multiple O?A and O?P channels,
+        # both with the same number, both starting with 0
+        channels, channel_index = np.unique(lines["channel"], return_inverse=True)
+
+        def channel_type(a):
+            if a.startswith(b"O") and a.endswith(b"A"):
+                return "OA"
+            elif a.startswith(b"O") and a.endswith(b"P"):
+                return "OP"
+            else:
+                return "M"
+
+        types = np.array([channel_type(a) for a in channels])[channel_index]
+        harmonics = np.array([int(a[1:-1]) if channel_type(a) != "M" else -1
+                              for a in channels])[channel_index]
+        numharmonics = harmonics.max() + 1
+
+        runs, run_index = np.unique(lines["run"], return_inverse=True)
+        rowcols, pixel_index = np.unique(np.column_stack((lines["row"], lines["column"])),
+                                         axis=0, return_inverse=True)
+        pixel_index = pixel_index.ravel()
+        npixels, nruns = len(rowcols), len(runs)
+
+        is_m = types == "M"
+        M = np.full((npixels, nruns, npoints), np.nan)
+        M[pixel_index[is_m], run_index[is_m]] = data[is_m]
+        # amplitudes and phases in the order of output rows of a pixel
+        O = np.full((npixels, nruns, 2, numharmonics, npoints), np.nan)
+        is_o = ~is_m
+        O[pixel_index[is_o], run_index[is_o], (types[is_o] == "OP").astype(int),
+          harmonics[is_o]] = data[is_o]
+
+        # the common X is within limits of all M channels
+        min_intp = np.max(np.min(data[is_m], axis=1))
+        max_intp = np.min(np.max(data[is_m], axis=1))
+        X = np.linspace(min_intp, max_intp, num=npoints)
+
+        # interpolate all channels of all runs of all pixels at once
+        interpolated = _interp_rows(M.reshape(npixels * nruns, npoints),
+                                    O.reshape(npixels * nruns, 2 * numharmonics, npoints),
+                                    X)
+        final_data = interpolated.reshape(npixels, nruns, 2 * numharmonics, npoints) \
+            .mean(axis=1).reshape(-1, npoints)
+
+        channel_names = ["O%dA" % i for i in range(numharmonics)] + \
+                        ["O%dP" % i for i in range(numharmonics)]
+        final_metas = np.empty((len(final_data), 3), dtype=object)
+        final_metas[:, :2] = np.repeat(rowcols, 2 * numharmonics, axis=0)
+        final_metas[:, 2] = np.tile(channel_names, npixels)
+
+        metas = [Orange.data.ContinuousVariable.make("row"),
+                 Orange.data.ContinuousVariable.make("column"),
+                 Orange.data.StringVariable.make("channel")]
+
+        domain = Orange.data.Domain(
+            [Orange.data.ContinuousVariable.make("%f" % f) for f in X],
+            None, metas=metas)
+        return Orange.data.Table(domain, final_data, metas=final_metas)
 
 
 def build_spec_table(wavenumbers, intensities):
@@ -813,14 +892,45 @@ def build_spec_table(wavenumbers, intensities):
     return table
 
 
-def getx(data):
+_x_axis_cache = {}  # id(domain) -> (weak reference to domain, x axis)
+
+
+def domain_x_axis(domain):
     """
-    Return x of the data. If all attribute names are numbers,
-    return their values. If not, return indices.
+    Return the x axis of domain attributes as a triplet (x, indices that
+    sort x, whether x is already sorted). The triplet is computed once
+    per Domain object; returned arrays are read-only. Attribute names
+    are assumed not to change after the domain is created.
     """
-    x = np.arange(len(data.domain.attributes), dtype="f")
+    key = id(domain)
+    cached = _x_axis_cache.get(key)
+    if cached is not None and cached[0]() is domain:
+        return cached[1]
+
+    x = np.arange(len(domain.attributes), dtype="f")
     try:
-        x = np.array([float(a.name) for a in data.domain.attributes])
+        x = np.array([float(a.name) for a in domain.attributes])
     except:
         pass
-    return x
+    xsind = np.argsort(x)
+    mon = bool(np.all(np.diff(xsind) >= 0))
+    x.flags.writeable = False
+    xsind.flags.writeable = False
+    axis = x, xsind, mon
+
+    try:
+        ref = weakref.ref(domain, lambda _, key=key: _x_axis_cache.pop(key, None))
+    except TypeError:  # not weakly referencable: do not cache
+        return axis
+    _x_axis_cache[key] = ref, axis
+    return axis
+
+
+def getx(data):
+    """
+    Return x of the data. If all attribute names are numbers,
+    return their values. If not, return indices.
+
+    The returned array is shared between calls and read-only.
+    """
+    return domain_x_axis(data.domain)[0]
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import numpy as np
 
 def peak_search(Ix):
@@ -15,13 +17,14 @@ def peak_search(Ix):
     zpd = Ix.argmax()
     return zpd
 
-def apodize(Ix, zpd, apod_func):
+@lru_cache(maxsize=32)
+def apodization_window(N, zpd, apod_func):
     """
-    Perform apodization of asymmetric interferogram using selected apodization
-    function
+    Compute the apodization function for an asymmetric interferogram.
+    Windows are cached; the returned array is read-only.
 
     Args:
-        Ix (np.array): 1D array with a single interferogram
+        N (int): Number of interferogram points
         zpd (int): Index of the Zero Phase Difference (centerburst)
         apod_func (int): One of apodization function options:
                             0 : Boxcar apodization
@@ -30,18 +33,17 @@ def apodize(Ix, zpd, apod_func):
                             3 : Blackman-Nuttall (Eric Peach implementation)
 
     Returns:
-        Ix_apod (np.array): 1D array of apodized Ix
+        Bs (np.array): 1D array with the apodization function
     """
 
     # Calculate negative and positive wing size
     # correcting zpd from 0-based index
-    N = Ix.shape[0]
     wing_n = zpd + 1
     wing_p = N - (zpd + 1)
 
     if apod_func == 0:
         # Boxcar apodization AKA as-collected
-        Bs = np.ones_like(Ix)
+        Bs = np.ones(N)
     elif apod_func == 1:
         # Blackman-Harris (3-term)
         # Reference: W. Herres and J. Gronholz, Bruker
@@ -88,12 +90,30 @@ def apodize(Ix, zpd, apod_func):
 
         # Create Blackman Nuttall Window according to the formula given by Wolfram.
         xs = np.arange(N)
-        Bs = np.zeros(N)
         Bs = 0.3635819\
             - 0.4891775 * np.cos(2*np.pi*xs/(2*delta - 1))\
             + 0.1365995 * np.cos(4*np.pi*xs/(2*delta - 1))\
             - 0.0106411 * np.cos(6*np.pi*xs/(2*delta - 1))
 
+    Bs.setflags(write=False)
+    return Bs
+
+def apodize(Ix, zpd, apod_func):
+    """
+    Perform apodization of asymmetric interferogram using selected apodization
+    function
+
+    Args:
+        Ix (np.array): 1D array with a single interferogram (or 2D array
+                       with interferograms in rows)
+        zpd (int): Index of the Zero Phase Difference (centerburst)
+        apod_func (int): Apodization function passed to apodization_window()
+
+    Returns:
+        Ix_apod (np.array): apodized Ix
+    """
+    Bs = apodization_window(Ix.shape[-1], zpd, apod_func)
+
     # Apodize the sampled Interferogram
     try:
         Ix_apod = Ix * Bs
@@ -115,12 +135,24 @@ def zero_fill(Ix, zff):
         Ix_zff: 1D array of Ix + zero fill
     """
     N = Ix.shape[0]
+    Ix_zff = np.hstack((Ix, np.zeros(zero_filled_size(N, zff) - N)))
+    return Ix_zff
+
+def zero_filled_size(N, zff):
+    """
+    Size of a zero-filled interferogram with N points.
+
+    Args:
+        N (int): Number of interferogram points
+        zff (int): Zero-filling factor
+
+    Returns:
+        N_zff (int): Number of points after zero filling
+    """
     # Calculate next power of two for DFT efficiency
     N_2 = int(np.exp2(np.ceil(np.log2(N))))
     # fill to N**2 * zff
-    zero_fill = ((N_2 - N) + (N_2 * (zff)))
-    Ix_zff = np.hstack((Ix, np.zeros(zero_fill)))
-    return Ix_zff
+    return N_2 + N_2 * zff
 
 def compute_phase(Ix, wavenumbers, dx,
                   phase_res=None, apod_func=1, zff=2):
@@ -140,47 +172,8 @@ def compute_phase(Ix, wavenumbers, dx,
     Returns:
         phase (np.array): 1D array of phase spectrum
     """
-    # Determine largest possible double-sided interferogram
-    # Calculate the index of the Zero Phase Difference (centerburst)
-    zpd = peak_search(Ix)
-    N = np.size(Ix)
-    delta = np.min([zpd , N - 1 - zpd])
-
-    if phase_res is not None:
-        L = int(1 / (dx * phase_res)) - 1
-        if L > delta:
-            L = delta
-    else:
-        L = delta
-
-    # Select small, double-sided interfergram for phase computation
-    Ixs = Ix[zpd - L : zpd + L]
-    zpd = peak_search(Ixs)
-    # Apodize, zero-fill
-    Ixs_apod = apodize(Ixs, zpd, apod_func)
-    Ixs_zff = zero_fill(Ixs_apod, zff)
-
-    Ixs_N = Ixs_zff.shape[0]
-    if zpd != peak_search(Ixs_zff):
-        raise ValueError("zpd: %d, new_zpd: %d" % (zpd, peak_search(Ixs_zff)))
-    # Rotate the sample so that the centerburst is at edges
-    Ixs_rot = np.hstack((Ixs_zff[zpd:],Ixs_zff[0:zpd]))
-    # Take FFT of Rotated Complete Graph
-    Ixs_fft = np.fft.rfft(Ixs_rot)
-
-    # Calculate wavenumbers in our sampled spectrum.
-    wavenumbers_sampled = np.fft.rfftfreq(Ixs_N, dx)
-
-    # Calculate the Phase Angle for the FT'd SampleGraph.
-    phase_sampled = np.arctan2( Ixs_fft.imag,
-                                Ixs_fft.real )
-
-    # Interpolate the complete Phase Data.
-    phase = np.interp(wavenumbers,
-                      wavenumbers_sampled,
-                      phase_sampled)
-
-    return phase
+    fft = IRFFT(dx, apod_func=apod_func, zff=zff, phase_res=phase_res)
+    return fft._phase(Ix[None], peak_search(Ix), wavenumbers)[0]
 
 def fft_single_sweep(Ix, dx, phase_res=None, apod_func=1, zff=2):
     """
@@ -200,37 +193,132 @@ def fft_single_sweep(Ix, dx, phase_res=None, apod_func=1, zff=2):
         phase: 1D array of frequency domain phase intensities
         wavenumbers: 1D array of corresponding wavenumber set
     """
+    fft = IRFFT(dx, apod_func=apod_func, zff=zff, phase_res=phase_res)
+    spectra, phases, wavenumbers = fft(Ix[None])
+    return spectra[0], phases[0], wavenumbers
 
-    # Calculate the index of the Zero Phase Difference (centerburst)
-    zpd = peak_search(Ix)
 
-    # Apodize, Zero-fill
-    Ix_apod = apodize(Ix, zpd, apod_func)
-    Ix_zff = zero_fill(Ix_apod, zff)
-    # Recaculate N and zpd
-    N_zff = Ix_zff.shape[0]
-    if zpd != peak_search(Ix_zff):
-        raise ValueError("zpd: %d, new_zpd: %d" % (zpd, peak_search(Ix_zff)))
-
-    # Calculate wavenumber set
-    wavenumbers = np.fft.rfftfreq(N_zff, dx)
-
-    # Compute phase spectrum
-    phase = compute_phase(Ix, wavenumbers, dx,
-                          phase_res, apod_func, zff)
-
-    # Rotate the Complete IFG so that the centerburst is at edges.
-    Ix_rot = np.hstack((Ix_zff[zpd:],Ix_zff[0:zpd]))
+class IRFFT():
+    """
+    Calculate FFT of multiple single-sweep interferograms at once.
 
-    # Take FFT of Rotated Complete Graph
-    Ix_fft = np.fft.rfft(Ix_rot)
+    Interferograms with the same zpd are apodized, zero-filled and
+    transformed together. fft_single_sweep() and compute_phase() use
+    it for a single interferogram.
 
-    # Calculate the Cosines and Sines
-    phase_cos = np.cos(phase)
-    phase_sin = np.sin(phase)
+    Args:
+        dx (float): Interferogram data point spacing (in cm)
+        apod_func (int): Apodization function passed to apodization_window()
+        zff (int): Zero-filling factor
+        phase_res (int): Resolution limit for phase spectrum (in wavenumbers)
+    """
 
-    # Calculate magnitude of complete Fourier Transform
-    spectrum =  phase_cos * Ix_fft.real \
-                + phase_sin * Ix_fft.imag
+    # approximate number of values in temporary arrays; interferograms
+    # are processed in blocks of rows that fit into the cache
+    block_size = 2**18
+
+    def __init__(self, dx, apod_func=1, zff=2, phase_res=None):
+        self.dx = dx
+        self.apod_func = apod_func
+        self.zff = zff
+        self.phase_res = phase_res
+
+    def __call__(self, Ix):
+        """
+        Args:
+            Ix (np.array): 2D array with a single-sweep interferogram in each row
+
+        Returns:
+            spectra: 2D array of frequency domain amplitude intensities
+            phases: 2D array of frequency domain phase intensities
+            wavenumbers: 1D array of corresponding wavenumber set
+        """
+        Ix = np.atleast_2d(Ix)
+        N = Ix.shape[1]
+        N_zff = zero_filled_size(N, self.zff)
+        wavenumbers = np.fft.rfftfreq(N_zff, self.dx)
+
+        spectra = np.empty((len(Ix), len(wavenumbers)))
+        phases = np.empty((len(Ix), len(wavenumbers)))
+
+        zpds = Ix.argmax(axis=1)
+        rows_per_block = max(1, self.block_size // N_zff)
+        for zpd in np.unique(zpds):
+            rows = np.flatnonzero(zpds == zpd)
+            for start in range(0, len(rows), rows_per_block):
+                block = rows[start:start + rows_per_block]
+                Ixb = Ix[block]
+                phase = self._phase(Ixb, zpd, wavenumbers)
+                Ix_fft = self._rotated_rfft(Ixb, zpd, N_zff)
+                spectrum = np.cos(phase)
+                spectrum *= Ix_fft.real
+                sin_imag = np.sin(phase)
+                sin_imag *= Ix_fft.imag
+                spectrum += sin_imag
+                spectra[block] = spectrum
+                phases[block] = phase
+
+        return spectra, phases, wavenumbers
+
+    def _rotated_rfft(self, Ix, zpd, N_zff):
+        """
+        Apodize and zero-fill interferograms with the given zpd, rotate
+        them so that the centerburst is at edges and take the FFT.
+        """
+        N = Ix.shape[1]
+        Ix_apod = apodize(Ix, zpd, self.apod_func)
+        new_zpd = Ix_apod.argmax(axis=1)
+        if N_zff > N:
+            # peak search on the zero-filled interferogram finds the zeros
+            new_zpd[Ix_apod.max(axis=1) < 0] = N
+        if np.any(new_zpd != zpd):
+            raise ValueError("zpd: %d, new_zpd: %d" % (zpd, new_zpd[new_zpd != zpd][0]))
+        # the zero-filled interferogram is written already rotated
+        Ix_rot = np.zeros((len(Ix), N_zff))
+        Ix_rot[:, :N - zpd] = Ix_apod[:, zpd:]
+        Ix_rot[:, N_zff - zpd:] = Ix_apod[:, :zpd]
+        return np.fft.rfft(Ix_rot, axis=1)
+
+    def _phase(self, Ix, zpd, wavenumbers):
+        """
+        Compute phase spectra of interferograms with the given zpd.
+        Uses either the specified phase resolution or the largest possible
+        double-sided interferogram.
+        """
+        N = Ix.shape[1]
+        delta = np.min([zpd, N - 1 - zpd])
+
+        if self.phase_res is not None:
+            L = int(1 / (self.dx * self.phase_res)) - 1
+            if L > delta:
+                L = delta
+        else:
+            L = delta
 
-    return spectrum, phase, wavenumbers
+        # Select small, double-sided interfergrams for phase computation
+        Ixs = Ix[:, zpd - L : zpd + L]
+        if Ixs.shape[1] == 0:
+            raise ValueError("zpd: %d is at the edge of the interferogram" % zpd)
+        Ixs_N = zero_filled_size(Ixs.shape[1], self.zff)
+        Ixs_fft = self._rotated_rfft(Ixs, L, Ixs_N)
+
+        # Calculate wavenumbers in our sampled spectrum.
+        wavenumbers_sampled = np.fft.rfftfreq(Ixs_N, self.dx)
+
+        # Calculate the Phase Angle for the FT'd SampleGraph.
+        phase_sampled = np.arctan2(Ixs_fft.imag, Ixs_fft.real)
+
+        # Interpolate the complete Phase Data with weights shared by all rows.
+        if len(wavenumbers_sampled) == 1:
+            return np.repeat(phase_sampled, len(wavenumbers), axis=1)
+        j = np.searchsorted(wavenumbers_sampled, wavenumbers, side="right") - 1
+        j = np.clip(j, 0, len(wavenumbers_sampled) - 2)
+        w = (wavenumbers - wavenumbers_sampled[j]) \
+            / (wavenumbers_sampled[j + 1] - wavenumbers_sampled[j])
+        w = np.clip(w, 0, 1)
+        phase = phase_sampled[:, j]
+        phase *= 1 - w
+        phase_next = phase_sampled[:, j + 1]
+        phase_next *= w
+        phase += phase_next
+        return phase
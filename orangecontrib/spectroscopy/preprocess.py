@@ -1,18 +1,24 @@
+import os
+import threading
 from collections import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from math import factorial
 
 import Orange
 import Orange.data
 import numpy as np
+import scipy.sparse
 from Orange.data.util import SharedComputeValue
-from Orange.preprocess.preprocess import Preprocess
+from Orange.preprocess.preprocess import Preprocess, PreprocessorList
 from scipy.interpolate import interp1d
-from scipy.ndimage import gaussian_filter1d
-from scipy.spatial.qhull import ConvexHull, QhullError
-from scipy.signal import savgol_filter
+from scipy.ndimage import gaussian_filter1d, convolve1d
+from scipy.signal import savgol_coeffs
 from sklearn.preprocessing import normalize as sknormalize
 from AnyQt.QtCore import Qt
 
-from orangecontrib.spectroscopy.data import getx
+from orangecontrib.spectroscopy.data import getx, domain_x_axis, _table_with_spectra
 from Orange.widgets.utils.annotated_data import get_next_name
 
 
@@ -30,17 +36,55 @@ class SelectColumn(SharedComputeValue):
         return common[:, self.feature]
 
 
+def _preprocessed_table(domain, data):
+    """
+    data.from_table(domain, data) for domains of preprocessors, which keeps
+    float32 spectra in float32. Orange computes new attributes into float64
+    arrays, so for float32 data the shared computation of SelectColumn
+    attributes is used directly.
+    """
+    if scipy.sparse.issparse(data.X) or data.X.dtype != np.float32:
+        return data.from_table(domain, data)
+    cvs = [a.compute_value for a in domain.attributes]
+    if domain.class_vars == data.domain.class_vars and domain.metas == data.domain.metas \
+            and cvs and all(isinstance(cv, SelectColumn)
+                            and cv.compute_shared is cvs[0].compute_shared for cv in cvs):
+        X = np.asarray(cvs[0].compute_shared(data), dtype=np.float32)
+        features = [cv.feature for cv in cvs]
+        if features != list(range(X.shape[1])):
+            X = X[:, features]
+        return _table_with_spectra(domain, X, data)
+    # other domains (for example, of integrals or PCA) are computed by Orange
+    table = data.from_table(domain, data)
+    table.X = table.X.astype(np.float32, copy=False)
+    return table
+
+
 class _PCAReconstructCommon:
     """Computation common for all PCA variables."""
 
-    def __init__(self, pca, components=None):
+    def __init__(self, pca, components=None, batch_size=None):
         self.pca = pca
         self.components = components
+        self.batch_size = batch_size
 
     def __call__(self, data):
         if data.domain != self.pca.pre_domain:
             data = data.from_table(self.pca.pre_domain, data)
-        pca_space = self.pca.transform(data.X)
+        batch_size = self.batch_size or len(data.X)
+        reconstructed = None
+        # reconstruct in blocks of rows to bound temporary memory
+        for start in range(0, len(data.X), batch_size):
+            block = self._reconstruct(data.X[start:start + batch_size])
+            if reconstructed is None:
+                reconstructed = np.empty((len(data.X), block.shape[1]))
+            reconstructed[start:start + len(block)] = block
+        if reconstructed is None:  # no rows
+            reconstructed = self._reconstruct(data.X)
+        return reconstructed
+
+    def _reconstruct(self, X):
+        pca_space = self.pca.transform(X)
         if self.components is not None:
             #set unused components to zero
             remove = np.ones(pca_space.shape[1])
@@ -52,14 +96,32 @@ class _PCAReconstructCommon:
 
 class PCADenoising(Preprocess):
 
-    def __init__(self, components=None):
+    def __init__(self, components=None, svd_solver="auto", batch_size=None):
+        """
+        :param components: number of components used for reconstruction
+        :param svd_solver: "auto", "full", "arpack" or "randomized" (faster
+            for a few components of large data)
+        :param batch_size: if set, PCA is fitted incrementally in blocks of
+            batch_size rows and reconstruction is done in such blocks
+        """
         self.components = components
+        self.svd_solver = svd_solver
+        self.batch_size = batch_size
 
     def __call__(self, data):
         if data and len(data.domain.attributes):
             maxpca = min(len(data.domain.attributes), len(data))
-            pca = Orange.projection.PCA(n_components=min(maxpca, self.components))(data)
-            commonfn = _PCAReconstructCommon(pca)
+            n_components = min(maxpca, self.components)
+            if self.batch_size:
+                batch_size = max(self.batch_size, n_components)
+                pca = Orange.projection.IncrementalPCA(n_components=n_components,
+                                                       batch_size=batch_size)(data)
+            else:
+                random_state = 0 if self.svd_solver == "randomized" else None
+                pca = Orange.projection.PCA(n_components=n_components,
+                                            svd_solver=self.svd_solver,
+                                            random_state=random_state)(data)
+            commonfn = _PCAReconstructCommon(pca, batch_size=self.batch_size)
 
             nats = []
             for i, at in enumerate(data.domain.attributes):
@@ -72,7 +134,7 @@ class PCADenoising(Preprocess):
         domain = Orange.data.Domain(nats, data.domain.class_vars,
                                     data.domain.metas)
 
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class GaussianFeature(SelectColumn):
@@ -103,12 +165,14 @@ class _GaussianCommon:
     def __call__(self, data):
         if data.domain != self.domain:
             data = data.from_table(self.domain, data)
-        xs, xsind, mon, X = _transform_to_sorted_features(data)
-        X, nans = _nan_extend_edges_and_interpolate(xs[xsind], X)
+        return _transform_sorted(data, self.transformed)
+
+    def transformed(self, x, X):
+        X, nans = _nan_extend_edges_and_interpolate(x, X)
         X = gaussian_filter1d(X, sigma=self.sd, mode="nearest")
         if nans is not None:
             X[nans] = np.nan
-        return _transform_back_to_features(xsind, mon, X)
+        return X
 
 
 class GaussianSmoothing(Preprocess):
@@ -116,13 +180,16 @@ class GaussianSmoothing(Preprocess):
     def __init__(self, sd=10.):
         self.sd = sd
 
+    def fusable_common(self, domain):
+        return _GaussianCommon(self.sd, domain)
+
     def __call__(self, data):
-        common = _GaussianCommon(self.sd, data.domain)
+        common = self.fusable_common(data.domain)
         atts = [a.copy(compute_value=GaussianFeature(i, common))
                 for i, a in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 
@@ -139,53 +206,53 @@ class _EMSC:
         self.use_b = use_b
         self.use_d = use_d
         self.use_e = use_e
+        self._model = None  # (wavenumbers, M, pseudo-inverse of M)
 
-    def __call__(self, data):
-        # about 85% of time in __call__ function is spent is lstsq
-
-        if data.domain != self.domain:  # transform into input domain
-            data = data.from_table(self.domain, data)  # self.domain is the domain which relates to the training data
-        # input data should not be assumed to be sorted
-        xs, xsind, mon, X = _transform_to_sorted_features(data)
-        wavenumbers = xs[xsind]
-        X, nans = _nan_extend_edges_and_interpolate(wavenumbers, X)
-
+    def _design_matrix(self, wavenumbers):
         # interpolate reference to the data
         ref_X = interp1d_with_unknowns_numpy(getx(self.reference), self.reference.X, wavenumbers)
-
-        wavenumbersSquared = wavenumbers * wavenumbers
         M = []
         if self.use_a:
             M.append(np.ones(len(wavenumbers)))
         if self.use_d:
             M.append(wavenumbers)
         if self.use_e:
-            M.append(wavenumbersSquared)
+            M.append(wavenumbers * wavenumbers)
         if self.use_b:
             M.append(ref_X)
-        M = np.vstack(M).T
-
-        newspectra = np.zeros(X.shape)
-        for i, rawspectrum in enumerate(X):
-            m = np.linalg.lstsq(M, rawspectrum)[0]
-            corrected = rawspectrum
-            n = 0
-            if self.use_a:
-                corrected = (corrected - (m[n] * M[:, n]))
-                n += 1
-            if self.use_d:
-                corrected = (corrected - (m[n] * M[:, n]))
-                n += 1
-            if self.use_e:
-                corrected = (corrected - (m[n] * M[:, n]))
-                n += 1
-            if self.use_b:
-                corrected = corrected/ m[n]
-            newspectra[i]=corrected
+        return np.vstack(M).T
+
+    def _factorized(self, wavenumbers):
+        """Return the design matrix and its pseudo-inverse. They are the same
+        for all spectra so they are computed only once for given wavenumbers."""
+        if self._model is None or not np.array_equal(self._model[0], wavenumbers):
+            M = self._design_matrix(wavenumbers)
+            self._model = wavenumbers, M, np.linalg.pinv(M)
+        return self._model[1:]
+
+    def __call__(self, data):
+        if data.domain != self.domain:  # transform into input domain
+            data = data.from_table(self.domain, data)  # self.domain is the domain which relates to the training data
+        # input data should not be assumed to be sorted
+        return _transform_sorted(data, self.transformed)
+
+    def transformed(self, wavenumbers, X):
+        X = np.asarray(X, dtype=np.float64)  # least squares need double precision
+        X, nans = _nan_extend_edges_and_interpolate(wavenumbers, X)
+
+        M, M_pinv = self._factorized(wavenumbers)
+
+        # least squares solutions for all spectra at once
+        m = np.dot(X, M_pinv.T)
+
+        n_add = int(self.use_a) + int(self.use_d) + int(self.use_e)
+        newspectra = X - np.dot(m[:, :n_add], M[:, :n_add].T)
+        if self.use_b:
+            newspectra /= m[:, n_add:n_add + 1]
 
         if nans is not None:
-            X[nans] = np.nan
-        return _transform_back_to_features(xsind, mon, newspectra)
+            newspectra[nans] = np.nan
+        return newspectra
 
 
 class EMSC(Preprocess):
@@ -199,13 +266,16 @@ class EMSC(Preprocess):
         self.use_d = use_d
         self.use_e = use_e
 
+    def fusable_common(self, domain):
+        return _EMSC(self.reference, self.use_a, self.use_b, self.use_d, self.use_e, domain)
+
     def __call__(self, data):
-        common = _EMSC(self.reference, self.use_a, self.use_b, self.use_d, self.use_e, data.domain)  # creates function for transforming data
+        common = self.fusable_common(data.domain)  # creates function for transforming data
         atts = [a.copy(compute_value=EMSCFeature(i, common))  # takes care of domain column-wise, by above transformation function
                 for i, a in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class Cut(Preprocess):
@@ -226,7 +296,7 @@ class Cut(Preprocess):
                        if (self.lowlim is not None and v <= self.lowlim) or
                           (self.highlim is not None and self.highlim <= v)]
         domain = Orange.data.Domain(okattrs, data.domain.class_vars, metas=data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class SavitzkyGolayFeature(SelectColumn):
@@ -234,9 +304,7 @@ class SavitzkyGolayFeature(SelectColumn):
 
 
 def _transform_to_sorted_features(data):
-    xs = getx(data)
-    xsind = np.argsort(xs)
-    mon = is_increasing(xsind)
+    xs, xsind, mon = domain_x_axis(data.domain)
     X = data.X
     X = X if mon else X[:, xsind]
     return xs, xsind, mon, X
@@ -246,6 +314,20 @@ def _transform_back_to_features(xsind, mon, X):
     return X if mon else X[:, np.argsort(xsind)]
 
 
+def _float_dtype(X):
+    """ float32 spectra (see SpectralFileFormat) are kept in float32,
+    everything else is computed in float64. """
+    return np.float32 if X.dtype == np.float32 else np.float64
+
+
+def _transform_sorted(data, fn):
+    """Apply fn(x, X), which expects features sorted by x, to data
+    and return the result in the original feature order."""
+    xs, xsind, mon, X = _transform_to_sorted_features(data)
+    res = np.asarray(fn(xs[xsind], X), dtype=_float_dtype(X))
+    return _transform_back_to_features(xsind, mon, res)
+
+
 def _fill_edges(mat):
     """Replace (inplace!) NaN at sides with the closest value"""
     for l in mat:
@@ -256,6 +338,65 @@ def _fill_edges(mat):
             l[li + 1:] = l[li]
 
 
+def _is_uniform(x, rtol=1e-3):
+    """ Is sorted x spaced uniformly (differences in rounding are allowed)? """
+    if len(x) < 3:
+        return True
+    step = (x[-1] - x[0]) / (len(x) - 1)
+    return np.allclose(np.diff(x), step, rtol=rtol, atol=0)
+
+
+@lru_cache(maxsize=64)
+def _savgol_kernel(window, polyorder, deriv):
+    coeffs = savgol_coeffs(window, polyorder, deriv=deriv, use="conv")
+    coeffs.setflags(write=False)
+    return coeffs
+
+
+def _savgol_operator(x, window, polyorder, deriv):
+    """
+    Sparse matrix of Savitzky-Golay local polynomial regressions for
+    non-uniformly spaced sorted x. Positions are measured in average
+    spacings; for uniform x the operator equals savgol_filter with
+    mode="nearest", which repeats edge values.
+    """
+    m = len(x)
+    step = (x[-1] - x[0]) / (m - 1)
+    left = window // 2
+    right = window - 1 - left
+    # x beyond the edges (for repeated edge values) continues uniformly
+    xp = np.concatenate((x[0] + step * np.arange(-left, 0), x,
+                         x[-1] + step * np.arange(1, right + 1)))
+    offsets = np.arange(window)
+    u = (xp[np.arange(m)[:, None] + offsets] - x[:, None]) / step
+    A = u[:, :, None] ** np.arange(polyorder + 1)
+    coeffs = np.linalg.pinv(A)[:, deriv, :] * factorial(deriv)
+    columns = np.clip(np.arange(m)[:, None] + offsets - left, 0, m - 1)
+    rows = np.repeat(np.arange(m), window)
+    # coefficients of repeated edge values are summed
+    return scipy.sparse.csr_matrix((coeffs.ravel(), (rows, columns.ravel())),
+                                   shape=(m, m))
+
+
+@lru_cache(maxsize=16)
+def _cached_savgol_operator(x_bytes, window, polyorder, deriv):
+    return _savgol_operator(np.frombuffer(x_bytes), window, polyorder, deriv)
+
+
+def savgol_filter_sorted(x, X, window, polyorder, deriv):
+    """
+    Savitzky-Golay filter of rows of X for sorted x with repeated edge
+    values. Uniform x use cached convolution kernels (as savgol_filter),
+    non-uniform x a cached sparse regression operator.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if _is_uniform(x):
+        return convolve1d(X, _savgol_kernel(window, polyorder, deriv),
+                          axis=-1, mode="nearest")
+    operator = _cached_savgol_operator(x.tobytes(), window, polyorder, deriv)
+    return operator.astype(_float_dtype(X), copy=False).dot(X.T).T
+
+
 class _SavitzkyGolayCommon:
 
     def __init__(self, window, polyorder, deriv, domain):
@@ -267,15 +408,16 @@ class _SavitzkyGolayCommon:
     def __call__(self, data):
         if data.domain != self.domain:
             data = data.from_table(self.domain, data)
-        xs, xsind, mon, X = _transform_to_sorted_features(data)
-        X, nans = _nan_extend_edges_and_interpolate(xs[xsind], X)
-        X = savgol_filter(X, window_length=self.window,
-                             polyorder=self.polyorder,
-                             deriv=self.deriv, mode="nearest")
+        return _transform_sorted(data, self.transformed)
+
+    def transformed(self, x, X):
+        X, nans = _nan_extend_edges_and_interpolate(x, X)
+        X = savgol_filter_sorted(x, X, window=self.window,
+                                 polyorder=self.polyorder, deriv=self.deriv)
         # set NaNs where there were NaNs in the original array
         if nans is not None:
             X[nans] = np.nan
-        return _transform_back_to_features(xsind, mon, X)
+        return X
 
 
 class SavitzkyGolayFiltering(Preprocess):
@@ -287,60 +429,148 @@ class SavitzkyGolayFiltering(Preprocess):
         self.polyorder = polyorder
         self.deriv = deriv
 
+    def fusable_common(self, domain):
+        return _SavitzkyGolayCommon(self.window, self.polyorder,
+                                    self.deriv, domain)
+
     def __call__(self, data):
-        common = _SavitzkyGolayCommon(self.window, self.polyorder,
-                                      self.deriv, data.domain)
+        common = self.fusable_common(data.domain)
         atts = [ a.copy(compute_value=SavitzkyGolayFeature(i, common))
                         for i,a in enumerate(data.domain.attributes) ]
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class RubberbandBaselineFeature(SelectColumn):
     pass
 
 
+def _lower_hull_baseline(x, Y):
+    """
+    Lower convex hulls of rows of Y (for sorted x) interpolated to x. Hulls
+    of all rows are computed together with the monotone chain algorithm.
+    Unknown values are skipped; the baseline is unknown outside of them.
+    """
+    n, m = Y.shape
+    Yt = np.ascontiguousarray(Y.T)
+    # per-row stacks of hull indices (and their values) in flat arrays
+    hull = np.empty(n * m, dtype=np.intp)
+    hull_y = np.empty(n * m)
+    first = np.arange(n) * m
+    top = first.copy()  # flat positions of stack tops
+    for k in range(m):
+        yk = Yt[k]
+        pushed = np.flatnonzero(~np.isnan(yk))
+        active = pushed
+        # pop points that do not make a counter-clockwise turn with point k
+        while len(active):
+            t = top[active]
+            enough = t >= first[active] + 2
+            active, t = active[enough], t[enough]
+            x1, y1 = x[hull[t - 2]], hull_y[t - 2]
+            cross = (x[hull[t - 1]] - x1) * (yk[active] - y1) \
+                - (hull_y[t - 1] - y1) * (x[k] - x1)
+            active = active[cross <= 0]
+            top[active] -= 1
+        t = top[pushed]
+        hull[t] = k
+        hull_y[t] = yk[pushed]
+        top[pushed] += 1
+
+    # the closest hull vertices on the left and right of every point
+    columns = np.arange(m)
+    in_hull = columns < (top - first)[:, None]
+    vertex = np.zeros((n, m), dtype=bool)
+    vertex[np.nonzero(in_hull)[0], hull.reshape(n, m)[in_hull]] = True
+    lo = np.where(vertex, columns, -1)
+    np.maximum.accumulate(lo, axis=1, out=lo)
+    hi = np.where(vertex, columns, m)[:, ::-1]
+    hi = np.minimum.accumulate(hi, axis=1)[:, ::-1]
+    outside = (lo == -1) | (hi == m)
+    lo[outside] = 0
+    hi[outside] = 0
+
+    rows = np.arange(n)[:, None]
+    y_lo = Y[rows, lo]
+    x_lo = x[lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (Y[rows, hi] - y_lo) / (x[hi] - x_lo)
+    baseline = slope * (x - x_lo) + y_lo
+    baseline[vertex] = Y[vertex]
+    baseline[outside] = np.nan
+    return baseline
+
+
+def _rubberband(x, X, peak_dir, sub):
+    if peak_dir == RubberbandBaseline.PeakPositive:
+        baseline = _lower_hull_baseline(x, X)
+    else:
+        baseline = -_lower_hull_baseline(x, -X)
+    if sub == 0:
+        return X - baseline
+    else:
+        return baseline
+
+
+# smaller parts are faster in the current process than in a new one
+_RUBBERBAND_MIN_ROWS_PER_PROCESS = 2000
+
+_process_pool = None  # (number of processes, ProcessPoolExecutor)
+_process_pool_lock = threading.Lock()
+
+
+def _get_process_pool(n_jobs):
+    """ A process pool with at least n_jobs processes that is reused
+    between calls, because starting processes (which import Orange) is slow. """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool[0] < n_jobs:
+            if _process_pool is not None:
+                _process_pool[1].shutdown(wait=False)
+            _process_pool = n_jobs, ProcessPoolExecutor(n_jobs)
+        return _process_pool[1]
+
+
+def _drop_process_pool(executor):
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None and _process_pool[1] is executor:
+            _process_pool = None
+
+
 class _RubberbandBaselineCommon:
 
-    def __init__(self, peak_dir, sub, domain):
+    def __init__(self, peak_dir, sub, domain, n_jobs=1):
         self.peak_dir = peak_dir
         self.sub = sub
         self.domain = domain
+        self.n_jobs = n_jobs
 
     def __call__(self, data):
         if data.domain != self.domain:
             data = data.from_table(self.domain, data)
-        xs, xsind, mon, X = _transform_to_sorted_features(data)
-        x = xs[xsind]
-        newd = np.zeros_like(data.X)
-        for rowi, row in enumerate(X):
-            # remove NaNs which ConvexHull can not handle
-            source = np.column_stack((x, row))
-            source = source[~np.isnan(source).any(axis=1)]
-            try:
-                v = ConvexHull(source).vertices
-            except QhullError:
-                # FIXME notify user
-                baseline = np.zeros_like(row)
-            else:
-                if self.peak_dir == RubberbandBaseline.PeakPositive:
-                    v = np.roll(v, -v.argmin())
-                    v = v[:v.argmax() + 1]
-                elif self.peak_dir == RubberbandBaseline.PeakNegative:
-                    v = np.roll(v, -v.argmax())
-                    v = v[:v.argmin() + 1]
-                # If there are NaN values at the edges of data then convex hull
-                # does not include the endpoints. Because the same values are also
-                # NaN in the current row, we can fill them with NaN (bounds_error
-                # achieves this).
-                baseline = interp1d(source[v, 0], source[v, 1], bounds_error=False)(x)
-            finally:
-                if self.sub == 0:
-                    newd[rowi] = row - baseline
-                else:
-                    newd[rowi] = baseline
-        return _transform_back_to_features(xsind, mon, newd)
+        return _transform_sorted(data, self.transformed)
+
+    def transformed(self, x, X):
+        n_jobs = self.n_jobs if self.n_jobs != -1 else os.cpu_count()
+        n_jobs = min(n_jobs, len(X) // _RUBBERBAND_MIN_ROWS_PER_PROCESS)
+        if n_jobs <= 1:
+            return _rubberband(x, X, self.peak_dir, self.sub)
+        # rows are independent, but the hull computation holds the GIL
+        # (it loops over columns), so they are split across processes
+        newd = np.empty_like(X)
+        bounds = np.linspace(0, len(X), n_jobs + 1).astype(int)
+        executor = _get_process_pool(n_jobs)
+        try:
+            futures = [(a, b, executor.submit(_rubberband, x, X[a:b], self.peak_dir, self.sub))
+                       for a, b in zip(bounds[:-1], bounds[1:])]
+            for a, b, f in futures:
+                newd[a:b] = f.result()
+        except BrokenProcessPool:
+            _drop_process_pool(executor)  # a new pool is started next time
+            raise
+        return newd
 
 
 class RubberbandBaseline(Preprocess):
@@ -348,22 +578,28 @@ class RubberbandBaseline(Preprocess):
     PeakPositive, PeakNegative = 0, 1
     Subtract, View = 0, 1
 
-    def __init__(self, peak_dir=PeakPositive, sub=Subtract):
+    def __init__(self, peak_dir=PeakPositive, sub=Subtract, n_jobs=1):
         """
         :param peak_dir: PeakPositive or PeakNegative
         :param sub: Subtract (baseline is subtracted) or View
+        :param n_jobs: number of processes computing baselines (-1 for all processors);
+            small data is processed in the current process
         """
         self.peak_dir = peak_dir
         self.sub = sub
+        self.n_jobs = n_jobs
+
+    def fusable_common(self, domain):
+        return _RubberbandBaselineCommon(self.peak_dir, self.sub, domain,
+                                         n_jobs=self.n_jobs)
 
     def __call__(self, data):
-        common = _RubberbandBaselineCommon(self.peak_dir, self.sub,
-                                           data.domain)
+        common = self.fusable_common(data.domain)
         atts = [a.copy(compute_value=RubberbandBaselineFeature(i, common))
                 for i, a in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class LinearBaselineFeature(SelectColumn):
@@ -380,9 +616,9 @@ class _LinearBaselineCommon:
     def __call__(self, data):
         if data.domain != self.domain:
             data = data.from_table(self.domain, data)
-        xs, xsind, mon, y = _transform_to_sorted_features(data)
-        x = xs[xsind]
+        return _transform_sorted(data, self.transformed)
 
+    def transformed(self, x, y):
         if np.any(np.isnan(y)):
             y, _ = _nan_extend_edges_and_interpolate(x, y)
 
@@ -391,7 +627,7 @@ class _LinearBaselineCommon:
         else:
             newd = _edge_baseline(x, y)
 
-        return _transform_back_to_features(xsind, mon, newd)
+        return newd
 
 
 class LinearBaseline(Preprocess):
@@ -407,14 +643,16 @@ class LinearBaseline(Preprocess):
         self.peak_dir = peak_dir
         self.sub = sub
 
+    def fusable_common(self, domain):
+        return _LinearBaselineCommon(self.peak_dir, self.sub, domain)
+
     def __call__(self, data):
-        common = _LinearBaselineCommon(self.peak_dir, self.sub,
-                                           data.domain)
+        common = self.fusable_common(data.domain)
         atts = [a.copy(compute_value=LinearBaselineFeature(i, common))
                 for i, a in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class NormalizeFeature(SelectColumn):
@@ -437,34 +675,52 @@ class _NormalizeCommon:
 
         if data.X.shape[0] == 0:
             return data.X
-        data = data.copy()
 
         if self.method == Normalize.Vector:
-            nans = np.isnan(data.X)
-            nan_num = nans.sum(axis=1, keepdims=True)
-            ys = data.X
-            if np.any(nan_num > 0):
-                # interpolate nan elements for normalization
-                x = getx(data)
-                ys = interp1d_with_unknowns_numpy(x, ys, x)
-                ys = np.nan_to_num(ys)  # edge elements can still be zero
-            data.X = sknormalize(ys, norm='l2', axis=1, copy=False)
-            if np.any(nan_num > 0):
-                # keep nans where they were
-                data.X[nans] = float("nan")
+            if not np.any(np.isnan(data.X)):  # sorting is only needed to interpolate
+                return _vector_normalize(data.X)
+            return _transform_sorted(data, self.transformed)
         elif self.method == Normalize.Area:
-            norm_data = Integrate(methods=self.int_method,
-                                  limits=[[self.lower, self.upper]])(data)
-            data.X /= norm_data.X
+            x, x_sorter, _ = domain_x_axis(data.domain)
+            return data.X / self._areas(data.X, x, x_sorter)[:, None]
         elif self.method == Normalize.Attribute:
             if self.attr in data.domain and isinstance(data.domain[self.attr], Orange.data.ContinuousVariable):
                 ndom = Orange.data.Domain([data.domain[self.attr]])
                 factors = data.transform(ndom)
-                data.X /= factors.X
-                nd = data.domain[self.attr]
+                return data.X / factors.X
             else:  # invalid attribute for normalization
-                data.X *= float("nan")
-        return data.X
+                return np.full(data.X.shape, np.nan)
+
+    def _areas(self, X, x, x_sorter):
+        """ Normalization factors computed with the chosen integral """
+        integral = self.int_method([self.lower, self.upper], None)
+        return integral.compute(None, _IntegrateShared(X, x, x_sorter))
+
+    def transformed(self, x, X):
+        """Vector or area normalization of spectra."""
+        if X.shape[0] == 0:
+            return X
+        if self.method == Normalize.Area:
+            return X / self._areas(X, x, None)[:, None]
+        nans = np.isnan(X)
+        nan_num = nans.sum(axis=1, keepdims=True)
+        if np.any(nan_num > 0):
+            # interpolate nan elements for normalization
+            ys = interp1d_with_unknowns_numpy(x, X, x)
+            ys = np.nan_to_num(ys)  # edge elements can still be zero
+            ys = sknormalize(ys, norm='l2', axis=1, copy=False)
+            # keep nans where they were
+            ys[nans] = float("nan")
+        else:
+            ys = _vector_normalize(X)
+        return ys
+
+
+def _vector_normalize(X):
+    """ Divide rows by their l2 norm (rows of zeros are kept) into a new array """
+    norms = np.sqrt(np.einsum("ij,ij->i", X, X))
+    norms[norms < 10 * np.finfo(norms.dtype).eps] = 1  # as sklearn's normalize
+    return X / norms[:, None]
 
 
 class Normalize(Preprocess):
@@ -478,14 +734,22 @@ class Normalize(Preprocess):
         self.int_method = int_method
         self.attr = attr
 
+    def fusable_common(self, domain):
+        if self.method == Normalize.Attribute:
+            return None
+        return self._common(domain)
+
+    def _common(self, domain):
+        return _NormalizeCommon(self.method, self.lower, self.upper,
+                                self.int_method, self.attr, domain)
+
     def __call__(self, data):
-        common = _NormalizeCommon(self.method, self.lower, self.upper,
-                                           self.int_method, self.attr, data.domain)
+        common = self._common(data.domain)
         atts = [a.copy(compute_value=NormalizeFeature(i, common))
                 for i, a in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 INTEGRATE_DRAW_CURVE_WIDTH = 2
@@ -513,14 +777,14 @@ class IntegrateFeature(SharedComputeValue):
         x_s, y_s = self.extract_data(data, common)
         return self.compute_draw_info(x_s, y_s)
 
+    def limit_indices(self, common):
+        """ Limiting indices into sorted x (inclusive left, exclusive right) """
+        return _limit_indices(common.xs, self.limits)
+
     def extract_data(self, data, common):
-        data, x, x_sorter = common
-        # find limiting indices (inclusive left, exclusive right)
-        lim_min, lim_max = min(self.limits), max(self.limits)
-        lim_min = np.searchsorted(x, lim_min, sorter=x_sorter, side="left")
-        lim_max = np.searchsorted(x, lim_max, sorter=x_sorter, side="right")
-        x_s = x[x_sorter][lim_min:lim_max]
-        y_s = data.X[:, x_sorter][:, lim_min:lim_max]
+        lim_min, lim_max = self.limit_indices(common)
+        x_s = common.xs[lim_min:lim_max]
+        y_s = common.ys[:, lim_min:lim_max]
         return x_s, y_s
 
     def compute_draw_info(self, x_s, y_s):
@@ -570,6 +834,33 @@ class IntegrateFeatureEdgeBaseline(IntegrateFeature):
                 ("curve", (x, ys, INTEGRATE_DRAW_BASELINE_PENARGS)),
                 ("fill", ((x, self.compute_baseline(x, ys)), (x, ys)))]
 
+    def baseline_integral(self, x0, x1, y0, y1):
+        """ Integral of the edge-to-edge baseline """
+        return (y0 + y1) / 2.0 * (x1 - x0)
+
+    def compute(self, data, common):
+        lim_min, lim_max = self.limit_indices(common)
+        if lim_max - lim_min < 2:
+            return super().compute(data, common)
+        cumulative = common.cumulative_trapz()
+        if cumulative is None:
+            return super().compute(data, common)
+        cumulative, cumulative_nans, positions = cumulative
+        first, last = positions[lim_min], positions[lim_max - 1]
+        if first < 0 or last - first != lim_max - 1 - lim_min:  # not in the shared windows
+            return super().compute(data, common)
+        # the difference of cumulative integrals (shared by all integrals)
+        # gives the same result as trapz of the window for rows without unknowns
+        ys, xs = common.ys, common.xs
+        integral = cumulative[:, last] - cumulative[:, first] \
+            - self.baseline_integral(xs[lim_min], xs[lim_max - 1], ys[:, lim_min], ys[:, lim_max - 1])
+        if cumulative_nans is not None:
+            unknowns = cumulative_nans[:, last + 1] != cumulative_nans[:, first]
+            if np.any(unknowns):
+                integral[unknowns] = self.compute_integral(xs[lim_min:lim_max],
+                                                           ys[unknowns, lim_min:lim_max])
+        return integral
+
 
 class IntegrateFeatureSimple(IntegrateFeatureEdgeBaseline):
     """ A simple y=0 integration on the provided data window. """
@@ -579,6 +870,9 @@ class IntegrateFeatureSimple(IntegrateFeatureEdgeBaseline):
     def compute_baseline(self, x_s, y_s):
         return np.zeros(y_s.shape)
 
+    def baseline_integral(self, x0, x1, y0, y1):
+        return 0
+
 
 class IntegrateFeaturePeakEdgeBaseline(IntegrateFeature):
     """ The maximum baseline-subtracted peak height in the provided window. """
@@ -674,8 +968,7 @@ class IntegrateFeatureAtPeak(IntegrateFeature):
             )
 
     def extract_data(self, data, common):
-        data, x, x_sorter = common
-        return x, data.X
+        return common.x, common.X
 
     def compute_baseline(self, x, y):
         return np.zeros(y.shape)
@@ -700,17 +993,85 @@ def _edge_baseline(x, y):
     return interp1d(x[i], y[:, i], axis=1)(x) if len(x) else 0
 
 
+def _limit_indices(xs, limits):
+    """ Limiting indices into sorted xs (inclusive left, exclusive right) """
+    lim_min = np.searchsorted(xs, min(limits), side="left")
+    lim_max = np.searchsorted(xs, max(limits), side="right")
+    return lim_min, lim_max
+
+
+class _IntegrateShared:
+    """
+    Data shared by all integrals of an Integrate: spectra are sorted by x
+    only once, and so are cumulative integrals over windows (limits) of
+    integrals that use them.
+    """
+
+    def __init__(self, X, x, x_sorter, windows=()):
+        """ x_sorter can be None if x is already sorted """
+        self.X = X
+        self.x = x
+        self.x_sorter = x_sorter
+        self.xs = x[x_sorter] if x_sorter is not None else x
+        self.windows = windows
+        self._ys = None
+        self._cumulative = None
+
+    @property
+    def ys(self):
+        if self._ys is None:
+            self._ys = self.X[:, self.x_sorter] if self.x_sorter is not None else self.X
+        return self._ys
+
+    def cumulative_trapz(self):
+        """
+        Cumulative trapezoidal integrals of sorted spectra (unknowns are
+        taken as 0) over the union of windows, cumulative counts of unknowns
+        (None without them) and positions of columns of ys in them (-1
+        for columns outside the windows).
+        The integral between columns i and j of a window is then
+        cumulative[:, positions[j]] - cumulative[:, positions[i]].
+
+        Return None if less than two windows would share them: one integral
+        is cheaper to compute directly.
+        """
+        if len(self.windows) < 2:
+            return None
+        if self._cumulative is None:
+            indices = [_limit_indices(self.xs, limits) for limits in self.windows]
+            columns = np.unique(np.concatenate([np.arange(*ind) for ind in indices]
+                                               + [np.array([], dtype=int)]))
+            ys = self.ys[:, columns]
+            nans = np.isnan(ys)
+            any_nans = np.any(nans)
+            if any_nans:
+                ys[nans] = 0
+            cumulative = np.zeros(ys.shape)
+            if ys.shape[1] > 1:
+                areas = np.diff(self.xs[columns]) * (ys[:, 1:] + ys[:, :-1]) / 2.0
+                areas[:, np.diff(columns) != 1] = 0  # gaps between windows
+                np.cumsum(areas, axis=1, out=cumulative[:, 1:])
+            cumulative_nans = None
+            if any_nans:
+                cumulative_nans = np.zeros((ys.shape[0], ys.shape[1] + 1), dtype=np.int32)
+                np.cumsum(nans, axis=1, out=cumulative_nans[:, 1:])
+            positions = np.full(len(self.xs), -1)
+            positions[columns] = np.arange(len(columns))
+            self._cumulative = cumulative, cumulative_nans, positions
+        return self._cumulative
+
+
 class _IntegrateCommon:
 
-    def __init__(self, domain):
+    def __init__(self, domain, windows=()):
         self.domain = domain
+        self.windows = windows  # limits of integrals using cumulative integrals
 
     def __call__(self, data):
         if data.domain != self.domain:
             data = data.from_table(self.domain, data)
-        x = getx(data)
-        x_sorter = np.argsort(x)
-        return data, x, x_sorter
+        x, x_sorter, _ = domain_x_axis(data.domain)
+        return _IntegrateShared(data.X, x, x_sorter, self.windows)
 
 
 class Integrate(Preprocess):
@@ -733,12 +1094,16 @@ class Integrate(Preprocess):
         self.metas = metas
 
     def __call__(self, data):
-        common = _IntegrateCommon(data.domain)
         atts = []
+        methods = []
         if self.limits:
             methods = self.methods
             if not isinstance(methods, Iterable):
                 methods = [methods] * len(self.limits)
+        windows = [limits for limits, method in zip(self.limits or [], methods)
+                   if issubclass(method, IntegrateFeatureEdgeBaseline)]
+        common = _IntegrateCommon(data.domain, windows)
+        if self.limits:
             names = self.names
             if not names:
                 names = [" - ".join("{0}".format(e) for e in l) for l in self.limits]
@@ -758,7 +1123,7 @@ class Integrate(Preprocess):
         else:
             domain = Orange.data.Domain(data.domain.attributes, data.domain.class_vars,
                                         metas=data.domain.metas + tuple(atts))
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 def features_with_interpolation(points, kind="linear", domain=None, handle_nans=True, interpfn=None):
@@ -784,42 +1149,163 @@ def remove_whole_nan_ys(x, ys):
     return x, ys
 
 
-def interp1d_with_unknowns_numpy(x, ys, points, kind="linear"):
-    if kind != "linear":
-        raise NotImplementedError
-    out = np.zeros((len(ys), len(points)))*np.nan
+def _nan_pattern_groups(nans):
+    """
+    Group rows by their pattern of unknown values. Return a list
+    of arrays of row indices, one for each distinct pattern.
+    """
+    if len(nans) == 0:
+        return []
+    if not nans.any():
+        return [np.arange(len(nans))]
+    packed = np.ascontiguousarray(np.packbits(nans, axis=1))
+    keys = packed.view(np.dtype((np.void, packed.shape[1]))).ravel()
+    _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    order = np.argsort(inverse.ravel(), kind="mergesort")
+    return np.split(order, np.cumsum(counts)[:-1])
+
+
+def _interp_linear_rows(xp, fps, points, columns=None):
+    """
+    Linearly interpolate every row of fps, defined at sorted xp, to points
+    (NaN outside of xp). Interpolation indices and weights are shared
+    by all rows. If given, columns are indices of fps columns
+    corresponding to xp.
+    """
+    out = np.full((len(fps), len(points)), np.nan)
+    if columns is None:
+        columns = np.arange(len(xp))
+    inside = np.flatnonzero((points >= xp[0]) & (points <= xp[-1]))
+    if len(xp) == 1:
+        out[:, inside] = fps[:, columns[:1]]
+        return out
+    p = points[inside]
+    j = np.searchsorted(xp, p, side="right") - 1
+    j = np.minimum(j, len(xp) - 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = (p - xp[j]) / (xp[j + 1] - xp[j])
+    w[~np.isfinite(w)] = 1  # repeated x at the end
+    # points that coincide with xp are copied
+    exact = w == 0
+    exact_cols, exact_out = columns[j[exact]], inside[exact]
+    j, w, inside = j[~exact], w[~exact], inside[~exact]
+    c0, c1 = columns[j], columns[j + 1]
+    # process in blocks of rows to keep temporary arrays small
+    block = max(1, 2**20 // max(1, len(p)))
+    for start in range(0, len(fps), block):
+        f = fps[start:start + block]
+        out[start:start + block, exact_out] = f[:, exact_cols]
+        y0 = f[:, c0]
+        y0 *= 1 - w
+        y1 = f[:, c1]
+        y1 *= w
+        y1 += y0
+        out[start:start + block, inside] = y1
+    return out
+
+
+def _interp1d_with_unknowns(x, ys, points, interpfn):
+    """
+    Interpolate rows of ys while ignoring their unknown values. Rows with the
+    same pattern of unknowns are interpolated together with
+    interpfn(xt, ys, points, columns), where xt are sorted x of known
+    values and columns their indices in ys.
+    """
     sorti = np.argsort(x)
-    x = x[sorti]
-    for i, y in enumerate(ys):
-        y = y[sorti]
-        nan = np.isnan(y)
-        xt = x[~nan]
-        yt = y[~nan]
+    if not is_increasing(sorti):
+        x = x[sorti]
+        ys = ys[:, sorti]
+    nans = np.isnan(ys)
+    groups = _nan_pattern_groups(nans)
+    if len(groups) == 1:
+        known = np.flatnonzero(~nans[0])
+        if len(known):  # avoid copying when all rows are alike
+            return interpfn(x[known], ys, points, known)
+    out = np.zeros((len(ys), len(points)))*np.nan
+    for rows in groups:
+        known = np.flatnonzero(~nans[rows[0]])
         # do not interpolate unknowns at the edges
-        if len(xt):  # check if all values are removed
-            out[i] = np.interp(points, xt, yt, left=np.nan, right=np.nan)
+        if len(known):  # check if all values are removed
+            out[rows] = interpfn(x[known], ys[rows], points, known)
     return out
 
 
+def interp1d_with_unknowns_numpy(x, ys, points, kind="linear"):
+    if kind != "linear":
+        raise NotImplementedError
+    return _interp1d_with_unknowns(x, ys, points, _interp_linear_rows)
+
+
 def interp1d_with_unknowns_scipy(x, ys, points, kind="linear"):
-    out = np.zeros((len(ys), len(points)))*np.nan
-    sorti = np.argsort(x)
-    x = x[sorti]
-    for i, y in enumerate(ys):
-        y = y[sorti]
-        nan = np.isnan(y)
-        xt = x[~nan]
-        yt = y[~nan]
-        if len(xt):  # check if all values are removed
-            out[i] = interp1d(xt, yt, fill_value=np.nan, assume_sorted=True,
-                              bounds_error=False, kind=kind, copy=False)(points)
-    return out
+    if kind == "linear":
+        interpfn = _interp_linear_rows
+    else:
+        def interpfn(xt, ys, points, columns):
+            return interp1d(xt, ys[:, columns], fill_value=np.nan, assume_sorted=True,
+                            bounds_error=False, kind=kind, copy=False)(points)
+    return _interp1d_with_unknowns(x, ys, points, interpfn)
 
 
 def interp1d_wo_unknowns_scipy(x, ys, points, kind="linear"):
     return interp1d(x, ys, fill_value=np.nan, kind=kind, bounds_error=False)(points)
 
 
+def _linear_interpolation_weights(x, points):
+    """
+    Sparse matrix (len(points) x len(x)) of linear interpolation weights and
+    a mask of points outside of x.
+    """
+    sorti = np.argsort(x)
+    xp = x[sorti]
+    outside = ~((points >= xp[0]) & (points <= xp[-1])) if len(xp) \
+        else np.ones(len(points), dtype=bool)
+    inside = np.flatnonzero(~outside)
+    p = points[inside]
+    if len(xp) == 1:
+        j = np.zeros(len(p), dtype=int)
+        w = np.zeros(len(p))
+        nxt = j
+    else:
+        j = np.searchsorted(xp, p, side="right") - 1
+        j = np.minimum(j, len(xp) - 2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = (p - xp[j]) / (xp[j + 1] - xp[j])
+        w[~np.isfinite(w)] = 1  # repeated x at the end
+        nxt = j + 1
+    rows = np.concatenate((inside, inside))
+    cols = sorti[np.concatenate((j, nxt))]
+    weights = np.concatenate((1 - w, w))
+    nonzero = weights != 0
+    matrix = scipy.sparse.csr_matrix((weights[nonzero], (rows[nonzero], cols[nonzero])),
+                                     shape=(len(points), len(x)))
+    return matrix, outside
+
+
+@lru_cache(maxsize=16)
+def _cached_linear_interpolation_weights(x_bytes, points_bytes):
+    return _linear_interpolation_weights(np.frombuffer(x_bytes),
+                                         np.frombuffer(points_bytes))
+
+
+def interp1d_wo_unknowns_sparse(x, ys, points, kind="linear"):
+    """
+    Linear interpolation with a precomputed sparse matrix of weights. Matrices
+    for the most recently used (x, points) pairs are cached, so repeated
+    interpolation between the same axes only multiplies matrices.
+    Unknown values only propagate to points interpolated from them.
+    """
+    if kind != "linear":
+        raise NotImplementedError
+    x = np.asarray(x, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64)
+    matrix, outside = _cached_linear_interpolation_weights(x.tobytes(), points.tobytes())
+    ys = np.asarray(ys)
+    dtype = _float_dtype(ys)
+    out = np.asarray(matrix.astype(dtype, copy=False).dot(ys.T).T, dtype=dtype)
+    out[:, outside] = np.nan
+    return out
+
+
 class _InterpolateCommon:
 
     def __init__(self, points, kind, domain, handle_nans=True, interpfn=None):
@@ -850,6 +1336,8 @@ class _InterpolateCommon:
                     interpfn = interp1d_with_unknowns_numpy
                 else:
                     interpfn = interp1d_with_unknowns_scipy
+            elif self.kind == "linear":
+                interpfn = interp1d_wo_unknowns_sparse
             else:
                 interpfn = interp1d_wo_unknowns_scipy
         return interpfn(x, ys, self.points, kind=self.kind)
@@ -877,7 +1365,7 @@ class Interpolate(Preprocess):
                                            self.handle_nans, interpfn=self.interpfn)
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class NotAllContinuousException(Exception):
@@ -932,9 +1420,13 @@ class _AbsorbanceCommon:
             absd = self.ref.X / data.X
             np.log10(absd, absd)
         else:
-            # Calculate from transmittance data
-            absd = np.log10(data.X)
-            absd *= -1
+            absd = self.transformed(None, data.X)
+        return absd
+
+    def transformed(self, x, X):
+        # Calculate from transmittance data
+        absd = np.log10(X)
+        absd *= -1
         return absd
 
 
@@ -952,6 +1444,10 @@ class Absorbance(Preprocess):
     def __init__(self, ref=None):
         self.ref = ref
 
+    def fusable_common(self, domain):
+        # reference spectra are aligned by position, not by x
+        return None if self.ref is not None else _AbsorbanceCommon(self.ref, domain)
+
     def __call__(self, data):
         common = _AbsorbanceCommon(self.ref, data.domain)
         newattrs = [Orange.data.ContinuousVariable(
@@ -959,7 +1455,7 @@ class Absorbance(Preprocess):
                     for i, var in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(
                     newattrs, data.domain.class_vars, data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class TransmittanceFeature(SelectColumn):
@@ -979,10 +1475,14 @@ class _TransmittanceCommon:
             # Calculate from single-channel data
             transd = data.X / self.ref.X
         else:
-            # Calculate from absorbance data
-            transd = data.X.copy()
-            transd *= -1
-            np.power(10, transd, transd)
+            transd = self.transformed(None, data.X)
+        return transd
+
+    def transformed(self, x, X):
+        # Calculate from absorbance data
+        transd = X.copy()
+        transd *= -1
+        np.power(10, transd, transd)
         return transd
 
 
@@ -1000,6 +1500,10 @@ class Transmittance(Preprocess):
     def __init__(self, ref=None):
         self.ref = ref
 
+    def fusable_common(self, domain):
+        # reference spectra are aligned by position, not by x
+        return None if self.ref is not None else _TransmittanceCommon(self.ref, domain)
+
     def __call__(self, data):
         common = _TransmittanceCommon(self.ref, data.domain)
         newattrs = [Orange.data.ContinuousVariable(
@@ -1007,7 +1511,7 @@ class Transmittance(Preprocess):
                     for i, var in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(
                     newattrs, data.domain.class_vars, data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
 
 
 class CurveShiftFeature(SelectColumn):
@@ -1023,7 +1527,10 @@ class _CurveShiftCommon:
     def __call__(self, data):
         if data.domain != self.domain:
             data = data.from_table(self.domain, data)
-        return data.X + self.amount
+        return self.transformed(None, data.X)
+
+    def transformed(self, x, X):
+        return X + self.amount
 
 
 class CurveShift(Preprocess):
@@ -1031,10 +1538,166 @@ class CurveShift(Preprocess):
     def __init__(self, amount=0.):
         self.amount = amount
 
+    def fusable_common(self, domain):
+        return _CurveShiftCommon(self.amount, domain)
+
     def __call__(self, data):
-        common = _CurveShiftCommon(self.amount, data.domain)
+        common = self.fusable_common(data.domain)
         atts = [a.copy(compute_value=CurveShiftFeature(i, common))
                 for i, a in enumerate(data.domain.attributes)]
         domain = Orange.data.Domain(atts, data.domain.class_vars,
                                     data.domain.metas)
-        return data.from_table(domain, data)
+        return _preprocessed_table(domain, data)
+
+
+class FusedFeature(SelectColumn):
+    pass
+
+
+class _FusedCommon:
+    """Run the computations of consecutive preprocessors on a single
+    array of spectra sorted by x."""
+
+    def __init__(self, commons, domain):
+        self.commons = commons
+        self.domain = domain
+
+    def __call__(self, data):
+        if data.domain != self.domain:
+            data = data.from_table(self.domain, data)
+        return _transform_sorted(data, self.transformed)
+
+    def transformed(self, x, X):
+        for common in self.commons:
+            X = common.transformed(x, X)
+        return X
+
+
+def _fusable_common(preprocessor, domain):
+    fc = getattr(preprocessor, "fusable_common", None)
+    return fc(domain) if fc is not None else None
+
+
+class FusedPreprocessorList(PreprocessorList):
+    """
+    A list of preprocessors where runs of consecutive spectral preprocessors
+    that keep the x axis (those with a fusable_common method) are computed
+    together without building intermediate tables.
+
+    The resulting domain still transforms new data.
+    """
+
+    def __call__(self, data):
+        run = []  # (preprocessor, common) pairs to be computed together
+        for pp in self.preprocessors:
+            common = _fusable_common(pp, data.domain)
+            if common is not None:
+                run.append((pp, common))
+            else:
+                data = self._apply_run(run, data)
+                run = []
+                data = pp(data)
+        return self._apply_run(run, data)
+
+    @staticmethod
+    def _apply_run(run, data):
+        if not run:
+            return data
+        if len(run) == 1:
+            return run[0][0](data)
+        common = _FusedCommon([c for _, c in run], data.domain)
+        atts = [a.copy(compute_value=FusedFeature(i, common))
+                for i, a in enumerate(data.domain.attributes)]
+        domain = Orange.data.Domain(atts, data.domain.class_vars,
+                                    data.domain.metas)
+        return _preprocessed_table(domain, data)
+
+
+def _row_blocks(data, chunk_size):
+    if isinstance(data, Orange.data.Table):
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+    else:
+        yield from data
+
+
+# preprocessors that transform each row independently of other rows
+_ROWWISE_PREPROCESSORS = (GaussianSmoothing, EMSC, Cut, SavitzkyGolayFiltering,
+                          RubberbandBaseline, LinearBaseline, Normalize, Integrate,
+                          Interpolate, InterpolateToDomain, Absorbance, Transmittance,
+                          CurveShift)
+
+
+def _rowwise(preprocessor):
+    if isinstance(preprocessor, PreprocessorList):
+        return all(_rowwise(pp) for pp in preprocessor.preprocessors)
+    if isinstance(preprocessor, (Absorbance, Transmittance)) \
+            and preprocessor.ref is not None:
+        # references with multiple rows are aligned with data by position
+        return len(preprocessor.ref) == 1
+    return isinstance(preprocessor, _ROWWISE_PREPROCESSORS)
+
+
+def preprocess_chunked(preprocessor, data, chunk_size=10000, out=None):
+    """
+    Apply a preprocessor to data in blocks of rows, so that temporary
+    arrays of preprocessors only hold a block at a time.
+
+    The preprocessor is called on the first block and the rest are
+    transformed into the resulting domain, which gives the same result as
+    preprocessor(data) only for preprocessors that transform each row
+    independently. Others (for example, PCADenoising, which is fitted on
+    data) raise a ValueError.
+
+    Args:
+        preprocessor: a Preprocess or a PreprocessorList
+        data: a Table or an iterable of Tables with the same domain
+              (for example, blocks of rows from a reader)
+        chunk_size (int): number of rows in a block if data is a Table
+        out (np.ndarray): preallocated array (for example, a np.memmap)
+                          for the output X; required if data is an iterable,
+                          so that blocks are not collected in memory
+
+    Returns:
+        Orange.data.Table
+    """
+    if not _rowwise(preprocessor):
+        raise ValueError("Chunked preprocessing requires preprocessors "
+                         "that transform each row independently")
+    is_table = isinstance(data, Orange.data.Table)
+    if out is None and not is_table:
+        raise ValueError("out is required for an iterable of blocks")
+    domain = None
+    Ys, metas, Ws = [], [], []
+    pos = 0
+    for block in _row_blocks(data, chunk_size):
+        if domain is None:
+            tblock = preprocessor(block)
+            domain = tblock.domain
+            n_rows = len(data) if is_table else len(out)
+            shape = (n_rows, tblock.X.shape[1])
+            if out is None:
+                out = np.empty(shape, dtype=tblock.X.dtype)
+            elif out.shape != shape:
+                raise ValueError("out has shape {}, expected {}".format(out.shape, shape))
+        else:
+            tblock = block.from_table(domain, block)
+        if pos + len(tblock) > len(out):
+            raise ValueError("out has fewer rows than data")
+        out[pos:pos + len(tblock)] = tblock.X
+        Ys.append(tblock.Y)
+        metas.append(tblock.metas)
+        Ws.append(tblock.W)
+        pos += len(tblock)
+
+    if domain is None:
+        if is_table:  # no rows
+            return preprocessor(data)
+        raise ValueError("No data blocks")
+    if pos != len(out):
+        raise ValueError("out has more rows than data")
+
+    rest = Orange.data.Table.from_numpy(
+        Orange.data.Domain([], domain.class_vars, domain.metas), np.zeros((len(out), 0)),
+        np.concatenate(Ys), np.concatenate(metas), np.concatenate(Ws))
+    return _table_with_spectra(domain, out, rest)  # from_numpy would convert float32 out
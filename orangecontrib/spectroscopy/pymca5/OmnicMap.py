@@ -34,6 +34,7 @@ import os
 import sys
 import re
 import struct
+import mmap #modified
 import numpy
 import copy
 from . import DataObject #modified
@@ -42,6 +43,14 @@ DEBUG = 0
 SOURCE_TYPE = "EdfFileStack"
 
 
+def _index(data, sub, start=0):
+    #modified: like bytes.index, but also for mmap objects
+    position = data.find(sub, start)
+    if position < 0:
+        raise ValueError("subsection not found")
+    return position
+
+
 class OmnicMap(DataObject.DataObject):
     '''
     Class to read OMNIC .map files
@@ -59,26 +68,65 @@ class OmnicMap(DataObject.DataObject):
             It is expected to work with OMNIC versions 7.x and 8.x
         '''
         DataObject.DataObject.__init__(self)
-        if sys.platform == 'win32' or 1: #modified, "added or 1"
-            fid = open(filename, 'rb')
+        #modified: the file is memory mapped instead of read into memory
+        with open(filename, 'rb') as fid, \
+                mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            omnicInfo = self._readHeaders(data)
+        self.sourceName = [filename]
+        #modified: all spectra are read with a single structured memory map
+        #and non-finite values are replaced by 0 while copying
+        records = numpy.memmap(filename, mode='r',
+                               dtype=self.recordDtype(self.nChannels),
+                               offset=self.firstSpectrumOffset,
+                               shape=(self.__nFiles * self.nRows,))
+        spectra = records['spectrum'].reshape(self.__nFiles, self.nRows,
+                                              self.nChannels)
+        self.data = numpy.zeros(spectra.shape, dtype=numpy.float32)
+        numpy.copyto(self.data, spectra, where=numpy.isfinite(spectra))
+        del spectra, records
+
+        #arrange as an EDF Stack
+        self.info = {}
+        self.__nImagesPerFile = 1
+        shape = self.data.shape
+        for i in range(len(shape)):
+            key = 'Dim_%d' % (i + 1,)
+            self.info[key] = shape[i]
+
+        self.info["SourceType"] = SOURCE_TYPE
+        self.info["SourceName"] = self.sourceName
+        self.info["Size"] = self.__nFiles * self.__nImagesPerFile
+        self.info["NumberOfFiles"] = self.__nFiles * 1
+        self.info["FileIndex"] = 0
+        self.info["Channel0"] = 0.0
+        if omnicInfo is not None:
+            self.info['McaCalib'] = [omnicInfo['First X value'] * 1.0,
+                                     omnicInfo['Data spacing'] * 1.0,
+                                     0.0]
         else:
-            fid = open(filename, 'r')
-        data = fid.read()
-        fid.close()
+            self.info["McaCalib"] = [0.0, 1.0, 0.0]
+        self.info['OmnicInfo'] = omnicInfo
+
+    @staticmethod
+    def recordDtype(nChannels):
+        """
+        A spectrum in a .map file: a 100 byte header
+        (with text from the 16th byte on) and nChannels float32
+        """
+        return numpy.dtype([('', 'V16'), ('header', 'S84'),
+                            ('spectrum', '<f4', (nChannels,))])
 
+    def _readHeaders(self, data):
+        """
+        Parse the file headers and positions in headers of spectra
+        """
         try:
             omnicInfo = self._getOmnicInfo(data)
         except:
             omnicInfo = None
-        self.sourceName = [filename]
-        if sys.version < '3.0':
-            searchedChain = "Spectrum "
-        else:
-            searchedChain = bytes("Spectrum ", 'utf-8')
-        firstByte = data.index(searchedChain)
-        s = data[firstByte:(firstByte + 100 - 16)]
-        if sys.version >= '3.0':
-            s = str(s)
+        searchedChain = bytes("Spectrum ", 'utf-8')
+        firstByte = _index(data, searchedChain)
+        s = str(data[firstByte:(firstByte + 100 - 16)])
         if DEBUG:
             print("firstByte = %d" % firstByte)
             print("s1 = %s " % s)
@@ -86,21 +134,10 @@ class OmnicMap(DataObject.DataObject):
         tmpValues = exp.findall(s)
         spectrumIndex = int(tmpValues[0])
         self.nSpectra = int(tmpValues[1])
-        if "X = " in s:
-            xPosition = float(tmpValues[2])
-            yPosition = float(tmpValues[3])
-        else:
-            # I have to calculate them from the scan
-            xPosition, yPosition = self.getPositionFromIndexAndInfo(0, omnicInfo)
         if DEBUG:
-            print("spectrumIndex, nSpectra, xPosition, yPosition = %d %d %f %f" %\
-                    (spectrumIndex, self.nSpectra, xPosition, yPosition))
-        if sys.version < '3.0':
-            chain = "Spectrum"
-        else:
-            chain = bytes("Spectrum", 'utf-8')
-        secondByte = data[(firstByte + 1):].index(chain)
-        secondByte += firstByte + 1
+            print("spectrumIndex, nSpectra = %d %d" % (spectrumIndex, self.nSpectra))
+        chain = bytes("Spectrum", 'utf-8')
+        secondByte = _index(data, chain, firstByte + 1)
         if DEBUG:
             print("secondByte = ", secondByte)
         self.nChannels = int((secondByte - firstByte - 100) / 4)
@@ -108,71 +145,48 @@ class OmnicMap(DataObject.DataObject):
             print("nChannels = %d" % self.nChannels)
         self.firstSpectrumOffset = firstByte - 16
 
-        #fill the header
-        self.header = []
-        oldXPosition = xPosition
-        oldYPosition = yPosition
-        self.nRows = 0
-        for i in range(self.nSpectra):
-            offset = int(firstByte + i * (100 + self.nChannels * 4))
-            if sys.version < '3.0':
-                s = data[offset:(offset + 100 - 16)]
-            else:
-                s = str(data[offset:(offset + 100 - 16)])
-            tmpValues = exp.findall(s)
-            spectrumIndex = int(tmpValues[0])
-            if "X = " in s:
-                xPosition = float(tmpValues[2])
-                yPosition = float(tmpValues[3])
-            else:
-                #I have to calculate them from the scan
-                xPosition, yPosition = self.getPositionFromIndexAndInfo(i, omnicInfo)
-            if (abs(yPosition - oldYPosition) > 1.0e-6) and\
-               (abs(xPosition - oldXPosition) < 1.0e-6):
+        #modified: positions are decoded together from the header field of
+        #records, in blocks of growing size until the first row ends
+        records = numpy.frombuffer(data, dtype=self.recordDtype(self.nChannels),
+                                   count=self.nSpectra, offset=self.firstSpectrumOffset)
+        self.nRows = self.nSpectra
+        start, size = 0, 256
+        while start < self.nSpectra:
+            stop = min(start + size, self.nSpectra)
+            xPositions, yPositions = self._headerPositions(
+                records['header'][start:stop], numpy.arange(start, stop), omnicInfo)
+            if start == 0:
+                oldXPosition, oldYPosition = xPositions[0], yPositions[0]
+            newRow = (numpy.abs(yPositions - oldYPosition) > 1.0e-6) & \
+                     (numpy.abs(xPositions - oldXPosition) < 1.0e-6)
+            if newRow.any():
+                self.nRows = start + int(numpy.argmax(newRow))
                 break
-            self.nRows = self.nRows + 1
+            start, size = stop, size * 2
+        del records  # release the buffer of data
         if DEBUG:
             print("DIMENSIONS X = %f Y=%d" %\
                   ((self.nSpectra * 1.0) / self.nRows, self.nRows))
-
-        #arrange as an EDF Stack
-        self.info = {}
         self.__nFiles = int(self.nSpectra / self.nRows)
-        self.data = numpy.zeros((self.__nFiles, self.nRows, self.nChannels),
-                                 dtype=numpy.float32)
+        return omnicInfo
 
-        self.__nImagesPerFile = 1
-        offset = firstByte - 16 + 100  # starting position of the data
-        delta = 100 + self.nChannels * 4
-        fmt = "%df" % self.nChannels
-        for i in range(self.__nFiles):
-            for j in range(self.nRows):
-                # this approach is inneficient when compared to a direct
-                # data readout, but it allows to deal with nan at the source
-                tmpData = numpy.zeros((self.nChannels,), dtype=numpy.float32)
-                tmpData[:] = struct.unpack(fmt,\
-                                data[offset:(offset + delta - 100)])
-                finiteData = numpy.isfinite(tmpData)
-                self.data[i, j, finiteData] = tmpData[finiteData]
-                offset = int(offset + delta)
-        shape = self.data.shape
-        for i in range(len(shape)):
-            key = 'Dim_%d' % (i + 1,)
-            self.info[key] = shape[i]
-
-        self.info["SourceType"] = SOURCE_TYPE
-        self.info["SourceName"] = self.sourceName
-        self.info["Size"] = self.__nFiles * self.__nImagesPerFile
-        self.info["NumberOfFiles"] = self.__nFiles * 1
-        self.info["FileIndex"] = 0
-        self.info["Channel0"] = 0.0
-        if omnicInfo is not None:
-            self.info['McaCalib'] = [omnicInfo['First X value'] * 1.0,
-                                     omnicInfo['Data spacing'] * 1.0,
-                                     0.0]
-        else:
-            self.info["McaCalib"] = [0.0, 1.0, 0.0]
-        self.info['OmnicInfo'] = omnicInfo
+    def _headerPositions(self, headers, indices, omnicInfo):
+        """
+        Positions of spectra with the given headers and indices
+        """
+        xPositions, yPositions = self.getPositionFromIndexAndInfo(indices, omnicInfo)
+        xPositions = xPositions * numpy.ones(len(indices))
+        yPositions = yPositions * numpy.ones(len(indices))
+        withXY = numpy.char.find(headers, b"X = ") >= 0
+        if withXY.any():
+            exp = re.compile(rb"X = (-?[0-9]+\.?[0-9]*)[^\n]*?Y = (-?[0-9]+\.?[0-9]*)")
+            values = exp.findall(b"\n".join(headers[withXY].tolist()))
+            if len(values) != withXY.sum():
+                raise ValueError("Unexpected spectrum headers")
+            values = numpy.array(values, dtype=float)
+            xPositions[withXY] = values[:, 0]
+            yPositions[withXY] = values[:, 1]
+        return xPositions, yPositions
 
     def _getOmnicInfo(self, data):
         '''
@@ -236,15 +250,9 @@ class OmnicMap(DataObject.DataObject):
             chain = 'Position'
         else:
             chain = bytes('Position', 'utf-8')
-        offset = data.index(chain)
-        positions = [offset]
-        while True:
-            try:
-                a = data[(offset + 1):].index(chain)
-                offset = a + offset + 1
-                positions.append(offset)
-            except ValueError:
-                break
+        #modified: only the first two positions are used
+        offset = _index(data, chain)
+        positions = [offset, _index(data, chain, offset + 1)]
 
         ddict = {}
         #map description position
@@ -296,7 +304,7 @@ class OmnicMap(DataObject.DataObject):
         deltaY = ddict['Mapping stage Y step size']
         nX = int(1 + ((x1 - x0) / deltaX))
         x = x0 + (index % nX) * deltaX
-        y = y0 + int(index / nX) * deltaY
+        y = y0 + (index // nX) * deltaY  #modified: also for arrays of indices
         return x, y
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+"""
+Persistent cache of parsed spectral files.
+
+Readers decorated with `cached` store what they parsed in the Orange data
+directory: arrays as .npy files, which are memory-mapped (copy-on-write) when
+the file is opened again, and everything else (domains, metas) pickled.
+Entries are keyed by the absolute path, size and modification time of the
+file and by the reader and its CACHE_VERSION, which every cached reader
+defines and bumps when its parsing changes; the least recently used entries
+are removed when the cache grows over `max_size`. The cache is disabled
+by default.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+from functools import wraps
+
+import numpy as np
+import Orange
+from Orange.misc.environ import data_dir
+
+
+# bump when the format of entries changes
+FORMAT_VERSION = 1
+
+enabled = False
+directory = None  # defaults to a directory in the Orange data directory
+max_size = 512 * 2**20  # bytes
+min_file_size = 2**20  # smaller files are parsed quickly enough
+
+
+def cache_dir():
+    if directory is not None:
+        return directory
+    return os.path.join(data_dir(), "spectroscopy", "read-cache")
+
+
+def _key(reader):
+    filename = os.path.abspath(reader.filename)
+    stat = os.stat(filename)
+    cls = type(reader)
+    parts = (filename, stat.st_size, stat.st_mtime_ns,
+             cls.__module__, cls.__qualname__, cls.CACHE_VERSION,
+             getattr(reader, "sheet", None), FORMAT_VERSION)
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def _encode(result):
+    """ Split a result into arrays that are saved as .npy and the rest """
+    if isinstance(result, Orange.data.Table):
+        if not isinstance(result.X, np.ndarray):  # sparse data
+            return None
+        rest = ("table", result.domain, result.Y, result.metas, result.W,
+                result.attributes, result.name)
+        return {"X": result.X}, rest
+    elif isinstance(result, tuple) and len(result) == 3:  # from read_spectra
+        xs, X, additional = result
+        return {"xs": np.asarray(xs), "X": np.asarray(X)}, ("spectra", additional)
+    return None
+
+
+def _decode(arrays, rest):
+    if rest[0] == "table":
+        domain, Y, metas, W, attributes, name = rest[1:]
+        table = Orange.data.Table.from_numpy(domain, arrays["X"], Y, metas, W)
+        table.X = arrays["X"]  # keep the memory map
+        table.attributes = attributes
+        table.name = name
+        return table
+    else:
+        return arrays["xs"], arrays["X"], rest[1]
+
+
+def _load(path):
+    with open(os.path.join(path, "rest.pkl"), "rb") as f:
+        names, rest = pickle.load(f)
+    arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode="c")
+              for name in names}
+    os.utime(path)  # mark as recently used
+    return _decode(arrays, rest)
+
+
+def _store(path, result):
+    encoded = _encode(result)
+    if encoded is None:
+        return
+    arrays, rest = encoded
+    base = cache_dir()
+    os.makedirs(base, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=base, prefix=".tmp-")
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), array, allow_pickle=False)
+        with open(os.path.join(tmp, "rest.pkl"), "wb") as f:
+            pickle.dump((list(arrays), rest), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    evict(max_size)
+
+
+def _entry_size(path):
+    return sum(os.stat(os.path.join(path, name)).st_size for name in os.listdir(path))
+
+
+def evict(size):
+    """ Remove least recently used entries until the cache is under size. """
+    base = cache_dir()
+    try:
+        names = os.listdir(base)
+    except FileNotFoundError:
+        return
+    paths = [os.path.join(base, name) for name in names if not name.startswith(".")]
+    entries = sorted((os.stat(path).st_mtime, path, _entry_size(path))
+                     for path in paths if os.path.isdir(path))
+    total = sum(s for _, _, s in entries)
+    for _, path, s in entries:
+        if total <= size:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= s
+
+
+def clear():
+    evict(0)
+
+
+def cached(read):
+    """ Decorate a reader's read or read_spectra method to use the cache. """
+    @wraps(read)
+    def cached_read(self):
+        if not enabled:
+            return read(self)
+        try:
+            if os.path.getsize(self.filename) < min_file_size:
+                return read(self)
+            path = os.path.join(cache_dir(), _key(self))
+        except OSError:  # let the reader report missing files
+            return read(self)
+        if os.path.isdir(path):
+            try:
+                return _load(path)
+            except Exception:  # pylint: disable=broad-except
+                shutil.rmtree(path, ignore_errors=True)  # corrupt entry
+        result = read(self)
+        try:
+            _store(path, result)
+        except Exception:  # pylint: disable=broad-except
+            pass  # caching is optional; for example, attributes can be unpicklable
+        return result
+    return cached_read
@@ -4,7 +4,8 @@ import numpy as np
 import Orange
 from orangecontrib.spectroscopy.preprocess import Interpolate, \
     interp1d_with_unknowns_numpy, interp1d_with_unknowns_scipy, \
-    interp1d_wo_unknowns_scipy, InterpolateToDomain, NotAllContinuousException
+    interp1d_wo_unknowns_scipy, interp1d_wo_unknowns_sparse, \
+    InterpolateToDomain, NotAllContinuousException
 from orangecontrib.spectroscopy.data import getx
 
 
@@ -111,6 +112,34 @@ class TestInterpolate(unittest.TestCase):
         np.testing.assert_almost_equal(data.X[2:], save_X[2:])
 
 
+    def test_nan_patterns_same_as_per_row(self):
+        rs = np.random.RandomState(0)
+        x = rs.permutation(20).astype(float)
+        ys = rs.rand(50, 20)
+        ys[rs.rand(50, 20) < 0.2] = np.nan
+        ys[:25, :3] = np.nan  # a common pattern
+        points = np.linspace(-2, 22, 50)
+        sorti = np.argsort(x)
+        expected = np.zeros((len(ys), len(points))) * np.nan
+        for i, y in enumerate(ys[:, sorti]):
+            known = ~np.isnan(y)
+            if np.any(known):
+                expected[i] = np.interp(points, x[sorti][known], y[known],
+                                        left=np.nan, right=np.nan)
+        for fn in [interp1d_with_unknowns_numpy, interp1d_with_unknowns_scipy]:
+            np.testing.assert_allclose(fn(x, ys, points), expected)
+
+    def test_sparse_same_as_scipy(self):
+        rs = np.random.RandomState(0)
+        x = rs.permutation(20).astype(float)
+        ys = rs.rand(10, 20)
+        points = np.concatenate((np.linspace(-2, 22, 50), x[:3]))
+        expected = interp1d_wo_unknowns_scipy(x, ys, points)
+        np.testing.assert_allclose(interp1d_wo_unknowns_sparse(x, ys, points), expected)
+        # the second call reuses the cached matrix
+        np.testing.assert_allclose(interp1d_wo_unknowns_sparse(x, ys, points), expected)
+
+
 class TestInterpolateToDomain(unittest.TestCase):
 
     def test_same_domain(self):
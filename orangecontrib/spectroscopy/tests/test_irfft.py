@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from orangecontrib.spectroscopy import irfft
+
+
+def interferograms(n, N=600):
+    rs = np.random.RandomState(0)
+    x = np.linspace(-1, 1, N)
+    centerburst = np.exp(-(x * 40) ** 2) * 10
+    return np.array([np.roll(centerburst, rs.randint(-3, 4)) + rs.rand(N) * 0.1
+                     for _ in range(n)])
+
+
+def reference_single_sweep(Ix, dx, phase_res, apod_func, zff):
+    """ The per-interferogram Mertz method with np.interp of the phase """
+    def rotated_rfft(Ix):
+        zpd = Ix.argmax()
+        Ix = irfft.zero_fill(irfft.apodize(Ix, zpd, apod_func), zff)
+        return np.fft.rfft(np.hstack((Ix[zpd:], Ix[:zpd]))), len(Ix)
+
+    zpd = Ix.argmax()
+    L = delta = min(zpd, len(Ix) - 1 - zpd)
+    if phase_res is not None:
+        L = min(int(1 / (dx * phase_res)) - 1, delta)
+    Ixs_fft, Ixs_N = rotated_rfft(Ix[zpd - L:zpd + L])
+    Ix_fft, N_zff = rotated_rfft(Ix)
+    wavenumbers = np.fft.rfftfreq(N_zff, dx)
+    phase = np.interp(wavenumbers, np.fft.rfftfreq(Ixs_N, dx),
+                      np.arctan2(Ixs_fft.imag, Ixs_fft.real))
+    spectrum = np.cos(phase) * Ix_fft.real + np.sin(phase) * Ix_fft.imag
+    return spectrum, phase, wavenumbers
+
+
+class TestIRFFT(unittest.TestCase):
+
+    def test_same_as_reference(self):
+        X = interferograms(20)
+        dx = 1.0 / 15797.337544 / 2.0
+        for apod_func in [0, 1, 2]:
+            for phase_res in [None, 32]:
+                spectra, phases, wavenumbers = \
+                    irfft.IRFFT(dx, apod_func=apod_func, zff=1, phase_res=phase_res)(X)
+                for row, spectrum, phase in zip(X, spectra, phases):
+                    s, p, w = reference_single_sweep(row, dx, phase_res, apod_func, 1)
+                    np.testing.assert_equal(wavenumbers, w)
+                    np.testing.assert_allclose(spectrum, s, rtol=1e-9, atol=1e-9)
+                    np.testing.assert_allclose(phase, p, rtol=1e-9, atol=1e-12)
+
+    def test_single_sweep(self):
+        X = interferograms(3)
+        dx = 1.0 / 15797.337544 / 2.0
+        spectra, phases, wavenumbers = irfft.IRFFT(dx, zff=2, phase_res=32)(X)
+        for row, spectrum, phase in zip(X, spectra, phases):
+            s, p, w = irfft.fft_single_sweep(row, dx, phase_res=32, zff=2)
+            np.testing.assert_equal(w, wavenumbers)
+            np.testing.assert_equal(s, spectrum)
+            np.testing.assert_equal(p, phase)
+            np.testing.assert_equal(irfft.compute_phase(row, w, dx, phase_res=32, zff=2), phase)
+
+    def test_apodization_window_cached(self):
+        w1 = irfft.apodization_window(600, 300, 1)
+        w2 = irfft.apodization_window(600, 300, 1)
+        self.assertIs(w1, w2)
+        self.assertFalse(w1.flags.writeable)
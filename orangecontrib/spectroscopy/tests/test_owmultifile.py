@@ -1,11 +1,13 @@
+import threading
 import unittest
 from unittest.mock import patch
 
 import numpy as np
 
 from Orange.widgets.tests.base import WidgetTest
-from orangecontrib.spectroscopy.widgets.owmultifile import OWMultifile, numpy_union_keep_order
-from Orange.data import FileFormat, dataset_dirs, Table
+from orangecontrib.spectroscopy.widgets.owmultifile import OWMultifile, numpy_union_keep_order, \
+    concatenate_data
+from Orange.data import FileFormat, dataset_dirs, Table, Domain
 
 from orangecontrib.spectroscopy.data import SPAReader
 from Orange.data.io import TabReader
@@ -24,6 +26,23 @@ class TestOWFilesAuxiliary(unittest.TestCase):
         A = np.array([])
         np.testing.assert_equal(numpy_union_keep_order(A, B), [5, 4, 6, 3])
 
+    def test_concatenate_spectra(self):
+        empty = Table.from_domain(Domain([]), n_rows=1)
+        a = np.array([1., 2.]), np.array([[1., 2.]]), empty
+        b = np.array([3., 2.]), np.array([[3., 4.]]), empty
+        iris = Table("iris")[:2]
+        data = concatenate_data([a, iris, b], ["a", "iris", "b"], "l")
+        self.assertEqual([v.name for v in data.domain.attributes[:3]],
+                         ["1.000000", "2.000000", "3.000000"])
+        np.testing.assert_equal(data.X[:, :3], [[1, 2, np.nan],
+                                                [np.nan, np.nan, np.nan],
+                                                [np.nan, np.nan, np.nan],
+                                                [np.nan, 4, 3]])
+        np.testing.assert_equal(data.X[1:3, 3:], iris.X)
+        np.testing.assert_equal(data.Y[1:3], iris.Y)
+        self.assertEqual(list(data.metas[:, 0]), ["a", "iris", "iris", "b"])
+        self.assertEqual(list(data.metas[:, 1]), ["l"] * 4)
+
 
 class TestOWFiles(WidgetTest):
 
@@ -115,8 +134,65 @@ class TestOWFiles(WidgetTest):
             # clear LRU cache so that new classes get use
             FileFormat._ext_to_attr_if_attr2.cache_clear()
             self.load_files("titanic.tab", "sample1.spa")
+            self.get_output("Data")  # wait for loading
             self.assertEqual(CountSPAReader.read_count, 0)
             self.assertEqual(CountSPAReader.read_spectra_count, 1)
             self.assertEqual(CountTabReader.read_count, 1)
             # clear cache so the new classes are thrown out
             FileFormat._ext_to_attr_if_attr2.cache_clear()
+
+    def test_read_only_changed_files(self):
+
+        class CountTabReader(TabReader):
+            read_count = 0
+
+            def read(self):
+                type(self).read_count += 1
+                return super().read()
+
+        with patch.object(FileFormat, "registry", {"TabReader": CountTabReader}):
+            FileFormat._ext_to_attr_if_attr2.cache_clear()
+            self.load_files("iris.tab")
+            self.get_output("Data")  # wait for loading
+            self.load_files("titanic.tab")
+            self.get_output("Data")
+            # iris was not read again
+            self.assertEqual(CountTabReader.read_count, 2)
+            self.widget.load_data()
+            self.assertEqual(CountTabReader.read_count, 2)
+            self.assertEqual(len(self.get_output("Data")),
+                             len(Table("iris")) + len(Table("titanic")))
+            FileFormat._ext_to_attr_if_attr2.cache_clear()
+
+    def test_cancel(self):
+        self.load_files("iris")
+        out = self.get_output("Data")
+        widget = self.widget
+        release, finished = threading.Event(), threading.Event()
+
+        class BlockingTabReader(TabReader):
+
+            def read(self):
+                release.wait(5)
+                try:
+                    return super().read()
+                finally:
+                    finished.set()
+
+        with patch.object(FileFormat, "registry", {"TabReader": BlockingTabReader}):
+            FileFormat._ext_to_attr_if_attr2.cache_clear()
+            self.load_files("titanic.tab")
+            self.assertTrue(widget.isBlocking())
+            widget.cancel_loading()
+            # cancelling did not wait for the read in progress
+            self.assertFalse(finished.is_set())
+            self.assertFalse(widget.isBlocking())
+            self.assertTrue(widget.Information.cancelled.is_shown())
+            self.assertIs(self.get_output("Data"), out)
+            release.set()
+            self.assertTrue(finished.wait(5))
+            self.process_events()
+            # the result of the cancelled read is discarded
+            self.assertIs(self.get_output("Data"), out)
+            self.assertTrue(widget.Information.cancelled.is_shown())
+            FileFormat._ext_to_attr_if_attr2.cache_clear()
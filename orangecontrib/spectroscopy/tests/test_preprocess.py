@@ -1,14 +1,18 @@
 import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
 
 import numpy as np
 import random
 import Orange
 from Orange.widgets.utils.annotated_data import get_next_name
-from orangecontrib.spectroscopy.data import getx
+from orangecontrib.spectroscopy.data import getx, build_spec_table, domain_x_axis
 from orangecontrib.spectroscopy.preprocess import Absorbance, Transmittance, \
     Integrate, Interpolate, Cut, SavitzkyGolayFiltering, \
     GaussianSmoothing, PCADenoising, RubberbandBaseline, \
-    Normalize, LinearBaseline, CurveShift, EMSC
+    Normalize, LinearBaseline, CurveShift, EMSC, FusedPreprocessorList, \
+    preprocess_chunked, _IntegrateShared, _get_process_pool
+from Orange.preprocess.preprocess import PreprocessorList
 
 
 # Preprocessors that work per sample and should return the same
@@ -45,6 +49,12 @@ PREPROCESSORS_GROUPS_OF_SAMPLES = [
 PREPROCESSORS = PREPROCESSORS_INDEPENDENT_SAMPLES + PREPROCESSORS_GROUPS_OF_SAMPLES
 
 
+def float32(data):
+    data = data.copy()
+    data.X = data.X.astype(np.float32)
+    return data
+
+
 def shuffle_attr(data):
     natts = list(data.domain.attributes)
     random.Random(0).shuffle(natts)
@@ -77,6 +87,12 @@ class TestTransmittance(unittest.TestCase):
         calcdata = Absorbance()(Transmittance()(data))
         np.testing.assert_allclose(data.X, calcdata.X)
 
+    def test_not_fusable_with_reference(self):
+        data = Orange.data.Table("collagen.csv")
+        self.assertIsNotNone(Transmittance().fusable_common(data.domain))
+        self.assertIsNone(Transmittance(ref=data[:1]).fusable_common(data.domain))
+        self.assertIsNone(Transmittance(ref=data[:0]).fusable_common(data.domain))
+
 
 class TestAbsorbance(unittest.TestCase):
 
@@ -96,6 +112,12 @@ class TestAbsorbance(unittest.TestCase):
         calcdata = Transmittance()(Absorbance()(data))
         np.testing.assert_allclose(data.X, calcdata.X)
 
+    def test_not_fusable_with_reference(self):
+        data = Orange.data.Table("collagen.csv")
+        self.assertIsNotNone(Absorbance().fusable_common(data.domain))
+        self.assertIsNone(Absorbance(ref=data[:1]).fusable_common(data.domain))
+        self.assertIsNone(Absorbance(ref=data[:0]).fusable_common(data.domain))
+
 
 class TestSavitzkyGolay(unittest.TestCase):
 
@@ -117,6 +139,17 @@ class TestSavitzkyGolay(unittest.TestCase):
         np.testing.assert_almost_equal(fdata.X,
             [[4.86857143, 3.47428571, 1.49428571, 0.32857143]])
 
+    def test_nonuniform(self):
+        """ Local polynomials on non-uniform x (positions in average spacings) """
+        x = np.sort(np.random.RandomState(0).rand(100)) * 1000 + 1000
+        data = build_spec_table(x, np.array([3 * x ** 2 + x]))
+        x = getx(data)
+        step = (x.max() - x.min()) / (len(x) - 1)
+        xs = np.argsort(x)
+        fdata = SavitzkyGolayFiltering(window=9, polyorder=2, deriv=1)(data)
+        np.testing.assert_allclose(fdata.X[0, xs][5:-5], (6 * x[xs] + 1)[5:-5] * step,
+                                   rtol=1e-5)
+
 
 class TestGaussian(unittest.TestCase):
 
@@ -200,6 +233,37 @@ class TestIntegrate(unittest.TestCase):
         np.testing.assert_equal(i.domain[0].compute_value.baseline(data)[1],
                                 [[1, 1, 1, 1, 1, 1]])
 
+    def test_many_ranges_same_as_trapz(self):
+        data = Orange.data.Table("collagen")[:20]
+        data.X[0, 100] = np.nan
+        limits = [[1000 + 40 * i, 1050 + 40 * i] for i in range(15)]
+        i = Integrate(methods=Integrate.Simple, limits=limits)(data)
+        x = getx(data)
+        xsind = np.argsort(x)
+        x, X = x[xsind], data.X[:, xsind]
+        for l, v in zip(limits, i.X.T):
+            window = (x >= l[0]) & (x <= l[1])
+            expected = np.trapz(X[1:, window], x[window], axis=1)
+            np.testing.assert_allclose(v[1:], expected)
+
+    def test_separate_ranges_same_as_trapz(self):
+        data = Orange.data.Table("collagen")[:20]
+        limits = [[1000, 1020], [1300, 1320], [1600, 1650]]
+        i = Integrate(methods=Integrate.Baseline, limits=limits)(data)
+        for l, v in zip(limits, i.X.T):
+            single = Integrate(methods=Integrate.Baseline, limits=[l])(data)
+            np.testing.assert_allclose(v, single.X[:, 0])
+
+    def test_cumulative_only_over_ranges(self):
+        data = Orange.data.Table("collagen")[:5]
+        x, x_sorter, _ = domain_x_axis(data.domain)
+        # a single range is integrated directly
+        self.assertIsNone(_IntegrateShared(data.X, x, x_sorter, [[1000, 1020]]).cumulative_trapz())
+        limits = [[1000, 1020], [1600, 1650]]
+        cumulative = _IntegrateShared(data.X, x, x_sorter, limits).cumulative_trapz()[0]
+        columns = sum(np.sum((x >= l[0]) & (x <= l[1])) for l in limits)
+        self.assertEqual(cumulative.shape, (5, columns))
+
     def test_empty_interval(self):
         data = Orange.data.Table([[1, 2, 3, 1, 1, 1]])
         i = Integrate(methods=Integrate.Simple, limits=[[10, 16]])(data)
@@ -271,6 +335,37 @@ class TestRubberbandBaseline(unittest.TestCase):
         i = RubberbandBaseline(peak_dir=RubberbandBaseline.PeakNegative)(data)
         np.testing.assert_equal(i.X, [[0, 0, -0.5, 0]])
 
+    def test_line(self):
+        """ Collinear points are their own baseline. """
+        data = Orange.data.Table([[1, 2, 3, 4], [1, np.nan, 3, 4]])
+        i = RubberbandBaseline(sub=RubberbandBaseline.View)(data)
+        np.testing.assert_equal(i.X, [[1, 2, 3, 4], [1, 2, 3, 4]])
+
+    def test_unknowns(self):
+        data = Orange.data.Table([[np.nan, 1, 2, 1, np.nan]])
+        i = RubberbandBaseline(sub=RubberbandBaseline.View)(data)
+        np.testing.assert_equal(i.X, [[np.nan, 1, 1, 1, np.nan]])
+
+    def test_processes(self):
+        data = Orange.data.Table("collagen")[:50]
+        single = RubberbandBaseline()(data)
+        with patch("orangecontrib.spectroscopy.preprocess.ProcessPoolExecutor",
+                   wraps=ProcessPoolExecutor) as pool, \
+                patch("orangecontrib.spectroscopy.preprocess._RUBBERBAND_MIN_ROWS_PER_PROCESS", 10), \
+                patch("orangecontrib.spectroscopy.preprocess._process_pool", None):
+            processes = RubberbandBaseline(n_jobs=3)(data)
+            again = RubberbandBaseline(n_jobs=2)(data)
+            _get_process_pool(1).shutdown()
+        pool.assert_called_once_with(3)  # the pool is reused
+        np.testing.assert_equal(single.X, processes.X)
+        np.testing.assert_equal(single.X, again.X)
+
+    def test_small_data_in_process(self):
+        data = Orange.data.Table("collagen")[:50]
+        with patch("orangecontrib.spectroscopy.preprocess.ProcessPoolExecutor") as pool:
+            RubberbandBaseline(n_jobs=3)(data)
+        pool.assert_not_called()
+
 
 class TestLinearBaseline(unittest.TestCase):
 
@@ -323,6 +418,13 @@ class TestNormalize(unittest.TestCase):
         q = Integrate(methods=Integrate.Simple, limits=[[0, 2]])(p)
         np.testing.assert_equal(q.X, np.ones_like(q.X))
 
+    def test_area_norm_same_as_integrate(self):
+        data = Orange.data.Table("collagen.csv")[:20]
+        for method in [Integrate.Simple, Integrate.Baseline, Integrate.PeakMax]:
+            p = Normalize(method=Normalize.Area, int_method=method, lower=1100, upper=1300)(data)
+            areas = Integrate(methods=method, limits=[[1100, 1300]])(data)
+            np.testing.assert_allclose(p.X, data.X / areas.X)
+
     def test_attribute_norm(self):
         data = Orange.data.Table([[2, 1, 2, 2, 3]])
         ndom = Orange.data.Domain(data.domain.attributes, data.domain.class_vars,
@@ -356,6 +458,22 @@ class TestCommon(unittest.TestCase):
         for proc in PREPROCESSORS:
             d2 = proc(data)
 
+    def test_float32(self):
+        """ Preprocessors keep float32 spectra in float32. """
+        data = float32(self.collagen)
+        for proc in PREPROCESSORS:
+            pdata = proc(data)
+            self.assertEqual(pdata.X.dtype, np.float32)
+            self.assertEqual(len(pdata), len(data))
+            np.testing.assert_equal(pdata.Y, data.Y)
+            np.testing.assert_equal(pdata.ids, data.ids)
+            # the domain still transforms float64 data
+            self.assertEqual(Orange.data.Table(pdata.domain, self.collagen).X.dtype,
+                             np.float64)
+        fused = FusedPreprocessorList(TestFusedPreprocessorList.PREPROCESSORS)
+        np.testing.assert_allclose(fused(data).X, fused(self.collagen).X,
+                                   rtol=1e-4, atol=1e-5)
+
     def test_no_attributes(self):
         """ Preprocessors should not crash when samples have no attributes. """
         data = self.collagen
@@ -394,6 +512,90 @@ class TestCommon(unittest.TestCase):
             self.assertFalse(np.any(sumnans > 1))
 
 
+class TestFusedPreprocessorList(unittest.TestCase):
+
+    PREPROCESSORS = [
+        GaussianSmoothing(sd=3.),
+        LinearBaseline(),
+        SavitzkyGolayFiltering(window=9, polyorder=2, deriv=1),
+        Cut(lowlim=1000, highlim=1800),
+        CurveShift(1),
+        Normalize(method=Normalize.Vector),
+        Normalize(method=Normalize.Area, int_method=Integrate.Simple, lower=1100, upper=1300),
+        Absorbance(),
+    ]
+
+    def test_same_as_unfused(self):
+        data = shuffle_attr(Orange.data.Table("collagen"))
+        data.X[0, 3] = np.nan
+        unfused = PreprocessorList(self.PREPROCESSORS)(data)
+        fused = FusedPreprocessorList(self.PREPROCESSORS)(data)
+        self.assertEqual([a.name for a in unfused.domain.attributes],
+                         [a.name for a in fused.domain.attributes])
+        np.testing.assert_allclose(unfused.X, fused.X)
+
+    def test_domain_conversion(self):
+        data = Orange.data.Table("collagen")
+        train, test = data[:100], data[100:]
+        fused = FusedPreprocessorList(self.PREPROCESSORS)(train)
+        transformed = Orange.data.Table(fused.domain, test)
+        np.testing.assert_allclose(transformed.X,
+                                   PreprocessorList(self.PREPROCESSORS)(test).X)
+
+
+class TestPreprocessChunked(unittest.TestCase):
+
+    PREPROCESSORS = TestFusedPreprocessorList.PREPROCESSORS
+
+    def test_same_as_whole(self):
+        data = Orange.data.Table("collagen")
+        whole = PreprocessorList(self.PREPROCESSORS)(data)
+        chunked = preprocess_chunked(PreprocessorList(self.PREPROCESSORS), data,
+                                     chunk_size=70)
+        self.assertEqual(whole.domain, chunked.domain)
+        np.testing.assert_allclose(whole.X, chunked.X)
+        np.testing.assert_equal(whole.Y, chunked.Y)
+
+    def test_blocks_into_out(self):
+        data = Orange.data.Table("collagen")
+        whole = FusedPreprocessorList(self.PREPROCESSORS)(data)
+        blocks = (data[i:i + 100] for i in range(0, len(data), 100))
+        out = np.empty(whole.X.shape)
+        chunked = preprocess_chunked(FusedPreprocessorList(self.PREPROCESSORS),
+                                     blocks, out=out)
+        np.testing.assert_allclose(whole.X, chunked.X)
+
+    def test_fitted_preprocessors(self):
+        data = Orange.data.Table("collagen")
+        for pp in [PCADenoising(components=2),
+                   PreprocessorList([Cut(lowlim=1000), PCADenoising(components=2)]),
+                   Absorbance(ref=data[:2])]:
+            with self.assertRaises(ValueError):
+                preprocess_chunked(pp, data, chunk_size=100)
+        preprocess_chunked(Absorbance(ref=data[:1]), data, chunk_size=100)
+
+    def test_out_checked(self):
+        data = Orange.data.Table("collagen")
+        pp = PreprocessorList(self.PREPROCESSORS)
+        n_features = len(pp(data[:1]).domain.attributes)
+        with self.assertRaises(ValueError):  # blocks would be collected
+            preprocess_chunked(pp, iter([data[:100], data[100:]]))
+        with self.assertRaises(ValueError):
+            preprocess_chunked(pp, data, out=np.empty((len(data), n_features + 1)))
+        for n_rows in [len(data) - 1, len(data) + 1]:
+            with self.assertRaises(ValueError):
+                preprocess_chunked(pp, iter([data[:100], data[100:]]),
+                                   out=np.empty((n_rows, n_features)))
+
+    def test_float32(self):
+        data = Orange.data.Table("collagen")
+        whole = PreprocessorList(self.PREPROCESSORS)(data)
+        chunked = preprocess_chunked(PreprocessorList(self.PREPROCESSORS), float32(data),
+                                     chunk_size=100)
+        self.assertEqual(chunked.X.dtype, np.float32)
+        np.testing.assert_allclose(whole.X, chunked.X, rtol=1e-4, atol=1e-5)
+
+
 class TestPCADenoising(unittest.TestCase):
 
     def test_no_samples(self):
@@ -403,6 +605,19 @@ class TestPCADenoising(unittest.TestCase):
         newdata = Orange.data.Table(d1.domain, data)
         np.testing.assert_equal(newdata.X, np.nan)
 
+    def test_randomized_and_incremental(self):
+        data = Orange.data.Table("collagen")
+        full = PCADenoising(components=5, svd_solver="full")(data)
+        randomized = PCADenoising(components=5, svd_solver="randomized")(data)
+        np.testing.assert_allclose(full.X, randomized.X, atol=1e-10)
+        incremental = PCADenoising(components=5, batch_size=100)(data)
+        # incremental fitting approximates the components (max difference 0.0054)
+        np.testing.assert_allclose(full.X, incremental.X, atol=0.01)
+        # and reconstructs data almost as well as the optimal full fit (+0.05%)
+        error_full = np.linalg.norm(data.X - full.X)
+        error_incremental = np.linalg.norm(data.X - incremental.X)
+        self.assertLess(error_incremental, error_full * 1.001)
+
 
 class TestCurveShift(unittest.TestCase):
 
@@ -434,3 +649,30 @@ class TestEMSC(unittest.TestCase):
         np.testing.assert_almost_equal(fdata.X,
                                        [[1.0, 2.0, 1.0, 1.0],
                                         [1.0, 2.0, 1.0, 1.0]])
+
+    def test_same_as_per_spectrum_lstsq(self):
+        data = Orange.data.Table("collagen")[:20]
+        reference = data[:1]
+        fdata = EMSC(reference=reference)(data)
+        x = getx(data)
+        M = np.vstack((np.ones(len(x)), x, x * x, reference.X[0])).T
+        for row, corrected in zip(data.X, fdata.X):
+            m = np.linalg.lstsq(M, row)[0]
+            expected = (row - np.dot(M[:, :3], m[:3])) / m[3]
+            np.testing.assert_allclose(corrected, expected, rtol=1e-6)
+
+    def test_unknowns(self):
+        data = Orange.data.Table("collagen")[:20]
+        reference = data[:1]
+        data = data.copy()
+        data.X[1, 3] = np.nan
+        data.X[2, :5] = np.nan
+        fdata = EMSC(reference=reference)(data)
+        np.testing.assert_equal(np.isnan(fdata.X), np.isnan(data.X))
+        # unknowns are interpolated for fitting
+        x = getx(data)
+        interpolated = data.copy()
+        interpolated.X[1, 3] = np.interp(x[3], x[[4, 2]], data.X[1, [4, 2]])  # x is descending
+        expected = EMSC(reference=reference)(interpolated).X[1]
+        expected[3] = np.nan
+        np.testing.assert_allclose(fdata.X[1], expected)
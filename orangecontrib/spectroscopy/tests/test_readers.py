@@ -1,13 +1,22 @@
 import unittest
+from unittest.mock import patch
 import tempfile
 import os
+import shutil
 
 import numpy as np
+from scipy.interpolate import interp1d
 import Orange
+from Orange.data import FileFormat, dataset_dirs
 from Orange.tests import named_file
-from orangecontrib.spectroscopy.data import getx
+from orangecontrib.spectroscopy.data import getx, domain_x_axis
 from orangecontrib.spectroscopy.preprocess import features_with_interpolation
-from orangecontrib.spectroscopy.data import SPAReader
+from orangecontrib.spectroscopy.data import SPAReader, AsciiMapReader, DatReader, EnviMapReader, _interp_rows, \
+    AgilentImageReader, agilentMosaicReader, \
+    _opus_image, _opus_regions, NeaReader, _spectra_from_image
+from orangecontrib.spectroscopy import readcache
+from orangecontrib.spectroscopy.pymca5 import OmnicMap
+from orangecontrib.spectroscopy.agilent import agilentMosaic
 
 from orangecontrib.spectroscopy.tests.bigdata import spectra20nea
 
@@ -40,6 +49,23 @@ class TestReaders(unittest.TestCase):
         np.testing.assert_allclose(dround.X[:, 1:-1], d2.X[:, 1:-1], rtol=0.011)
 
 
+class TestGetx(unittest.TestCase):
+
+    def test_cached_per_domain(self):
+        d = Orange.data.Table("collagen.csv")
+        x = getx(d)
+        self.assertIs(x, getx(d))
+        self.assertIs(x, getx(d[:5]))  # same domain
+        self.assertFalse(x.flags.writeable)
+        x, xsind, mon = domain_x_axis(d.domain)
+        np.testing.assert_equal(xsind, np.argsort(x))
+        self.assertEqual(mon, np.all(np.diff(xsind) >= 0))
+
+    def test_not_numeric(self):
+        d = Orange.data.Table("iris")
+        np.testing.assert_equal(getx(d), np.arange(4))
+
+
 class TestDat(unittest.TestCase):
 
     def test_peach_juice(self):
@@ -90,6 +116,69 @@ class TestAsciiMapReader(unittest.TestCase):
             d.save("test.xyz")
 
 
+class TestReadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.old = readcache.enabled, readcache.directory, readcache.min_file_size
+        readcache.enabled, readcache.directory, readcache.min_file_size = \
+            True, self.directory, 0
+
+    def tearDown(self):
+        readcache.enabled, readcache.directory, readcache.min_file_size = self.old
+        shutil.rmtree(self.directory)
+
+    def test_cached(self):
+        fn = FileFormat.locate("map_test.xyz", dataset_dirs)
+        d1 = AsciiMapReader(fn).read()
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        d2 = AsciiMapReader(fn).read()
+        self.assertIsInstance(d2.X, np.memmap)
+        np.testing.assert_equal(d1.X, d2.X)
+        np.testing.assert_equal(d1.metas, d2.metas)
+        self.assertEqual(d1.domain, d2.domain)
+        d2.X[0, 0] = 42  # changes are not written back
+        np.testing.assert_equal(AsciiMapReader(fn).read().X, d1.X)
+
+    def test_cache_version(self):
+        fn = FileFormat.locate("map_test.xyz", dataset_dirs)
+        AsciiMapReader(fn).read()
+        with patch.object(AsciiMapReader, "CACHE_VERSION", AsciiMapReader.CACHE_VERSION + 1):
+            d = AsciiMapReader(fn).read()
+        self.assertNotIsInstance(d.X, np.memmap)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_evict(self):
+        AsciiMapReader(FileFormat.locate("map_test.xyz", dataset_dirs)).read()
+        DatReader(FileFormat.locate("peach_juice.dpt", dataset_dirs)).read()
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        readcache.evict(1)
+        self.assertEqual(len(os.listdir(self.directory)), 0)
+
+
+class TestSpectraFromImage(unittest.TestCase):
+
+    def test_pixels_and_locations(self):
+        X = np.arange(2 * 3 * 4, dtype=np.float32).reshape((2, 3, 4))
+        features = np.arange(4)
+        xs, spectra, additional = _spectra_from_image(X, features, [10, 20, 30], [5, 6])
+        self.assertIs(xs, features)
+        # pixels are ordered by rows
+        np.testing.assert_equal(spectra, X.reshape((6, 4)))
+        self.assertTrue(np.shares_memory(spectra, X))  # a view of a float32 image
+        self.assertEqual([m.name for m in additional.domain.metas], ["map_x", "map_y"])
+        np.testing.assert_equal(additional.metas, [[10, 5], [20, 5], [30, 5],
+                                                   [10, 6], [20, 6], [30, 6]])
+
+    def test_no_locations(self):
+        X = np.arange(2 * 3 * 4).reshape((2, 3, 4))
+        _, spectra, additional = _spectra_from_image(X, np.arange(4), None, None)
+        self.assertEqual(spectra.dtype, np.float32)
+        np.testing.assert_equal(spectra, X.reshape((6, 4)))
+        self.assertEqual(len(additional), 6)
+        self.assertEqual(len(additional.domain.metas), 0)
+
+
 class TestAgilentReader(unittest.TestCase):
 
     def test_image_read(self):
@@ -125,6 +214,71 @@ class TestAgilentReader(unittest.TestCase):
         self.assertEqual(min(getx(d)), 1990.178226)
         self.assertEqual(max(getx(d)), 2113.600132)
 
+    def test_mosaic_lazy(self):
+        am = agilentMosaic(FileFormat.locate("agilent/5_mosaic_agg1024.dms", dataset_dirs))
+        self.assertIsInstance(am.tiles[0][0], np.memmap)
+        self.assertIsNone(am._data)
+        self.assertEqual(am.data.shape, (am.width, am.height, len(am.wavenumbers)))
+
+    def test_float32(self):
+        for reader, fn in [(AgilentImageReader, "agilent/4_noimage_agg256.seq"),
+                           (agilentMosaicReader, "agilent/5_mosaic_agg1024.dms")]:
+            fn = FileFormat.locate(fn, dataset_dirs)
+            d64 = reader(fn).read()
+            d32 = reader(fn, dtype=np.float32).read()
+            self.assertEqual(d64.X.dtype, np.float64)
+            self.assertEqual(d32.X.dtype, np.float32)
+            np.testing.assert_equal(d32.X, d64.X)
+            np.testing.assert_equal(d32.metas, d64.metas)
+        # the default is not changed
+        self.assertEqual(Orange.data.Table("agilent/4_noimage_agg256.seq").X.dtype,
+                         np.float64)
+
+    def test_wavenumber_range(self):
+        for reader, fn in [(AgilentImageReader, "agilent/4_noimage_agg256.seq"),
+                           (agilentMosaicReader, "agilent/5_mosaic_agg1024.dms")]:
+            fn = FileFormat.locate(fn, dataset_dirs)
+            whole = reader(fn).read()
+            part = reader(fn, wavenumber_range=(2010, 2090)).read()
+            x = getx(whole)
+            inside = (x >= 2010) & (x <= 2090)
+            np.testing.assert_equal(getx(part), x[inside])
+            np.testing.assert_equal(part.X, whole.X[:, inside])
+            np.testing.assert_equal(part.metas, whole.metas)
+
+    def test_mosaic_roi(self):
+        fn = FileFormat.locate("agilent/5_mosaic_agg1024.dms", dataset_dirs)
+        whole = agilentMosaicReader(fn).read()
+        part = agilentMosaicReader(fn, roi=(150, 400, 1000, 300)).read()  # spans tiles
+        x, y = whole[:, "map_x"].metas[:, 0], whole[:, "map_y"].metas[:, 0]
+        inside = (x >= 150) & (x <= 400) & (y >= 300) & (y <= 1000)
+        self.assertEqual(len(part), 4 * 2)
+        np.testing.assert_equal(part.X, whole.X[inside])
+        np.testing.assert_equal(part.metas, whole.metas[inside])
+        # a region outside of the map
+        empty = agilentMosaicReader(fn, roi=(2000, 3000, 0, 100)).read()
+        self.assertEqual(empty.X.shape, (0, whole.X.shape[1]))
+        # options do not leak to other readers
+        self.assertIsNone(agilentMosaicReader(fn).roi)
+        self.assertEqual(len(Orange.data.Table(fn)), len(whole))
+
+    def test_mosaic_not_assembled(self):
+        fn = FileFormat.locate("agilent/5_mosaic_agg1024.dms", dataset_dirs)
+        expected = agilentMosaic(fn).data
+        # the reader copies tiles into the table without assembling the cube
+        with patch.object(agilentMosaic, "_assemble", side_effect=AssertionError):
+            d = agilentMosaicReader(fn).read()
+        np.testing.assert_equal(d.X, expected.reshape(len(d), -1))
+        region = agilentMosaic(fn).read_region((0, 8), (0, 4), dtype=np.float64)
+        self.assertEqual(region.dtype, np.float64)
+        np.testing.assert_equal(region, expected)
+
+    def test_mosaic_region(self):
+        am = agilentMosaic(FileFormat.locate("agilent/5_mosaic_agg1024.dms", dataset_dirs))
+        region = am.read_region((2, 7), (1, 3))
+        self.assertIsNone(am._tiles)  # tiles are opened on demand
+        np.testing.assert_equal(region, am.data[2:7, 1:3])
+
     def test_envi_comparison(self):
         # Image
         d1_a = Orange.data.Table("agilent/4_noimage_agg256.seq")
@@ -139,6 +293,81 @@ class TestAgilentReader(unittest.TestCase):
         np.testing.assert_allclose(getx(d2_a), getx(d2_e))
 
 
+class TestEnvi(unittest.TestCase):
+
+    def test_wavenumber_range(self):
+        fn = FileFormat.locate("agilent/4_noimage_agg256.hdr", dataset_dirs)
+        whole = EnviMapReader(fn).read()
+        part = EnviMapReader(fn, wavenumber_range=(2050, 2000)).read()
+        x = getx(whole)
+        inside = (x >= 2000) & (x <= 2050)
+        np.testing.assert_equal(getx(part), x[inside])
+        np.testing.assert_equal(part.X, whole.X[:, inside])
+        np.testing.assert_equal(part.metas, whole.metas)
+        part.X[0, 0] = 1  # not a view into the file
+
+    def test_dtype(self):
+        fn = FileFormat.locate("agilent/4_noimage_agg256.hdr", dataset_dirs)
+        _, X64, _ = EnviMapReader(fn).read_spectra()
+        self.assertEqual(X64.dtype, np.float64)
+        _, X32, _ = EnviMapReader(fn, dtype=np.float32).read_spectra()
+        self.assertEqual(X32.dtype, np.float32)
+        np.testing.assert_equal(X32, X64.astype(np.float32))
+
+
+class TestOmnicMap(unittest.TestCase):
+
+    def test_records(self):
+        spectra = np.arange(6 * 5, dtype=np.float32).reshape(6, 5)
+        spectra[2, 3] = np.nan
+        content = b"\x01" * 300
+        for i, s in enumerate(spectra):
+            header = "Spectrum %d of 6, X = %.1f, Y = %.1f" % (i + 1, i % 3, i // 3)
+            content += b"\x00" * 16 + header.encode().ljust(84, b"\x00") + s.tobytes()
+        with named_file("", suffix=".map") as fn:
+            with open(fn, "wb") as f:
+                f.write(content + b"\x00" * 100)
+            om = OmnicMap.OmnicMap(fn)
+        self.assertEqual(om.data.shape, (2, 3, 5))
+        spectra[2, 3] = 0  # unknown values are zeros
+        np.testing.assert_equal(om.data.reshape(6, 5), spectra)
+
+    def test_rows_from_headers(self):
+        om = OmnicMap.OmnicMap.__new__(OmnicMap.OmnicMap)
+        headers = np.array([b"Spectrum 1 of 4, X = 1.5, Y = -2.0",
+                            b"Spectrum 2 of 4",
+                            b"Spectrum 3 of 4, X = 1.5, Y = 3.0"])
+        info = {'First map location': [0., 0.], 'Last map location': [1., 1.],
+                'Mapping stage X step size': 1., 'Mapping stage Y step size': 1.}
+        x, y = om._headerPositions(headers, np.arange(3), info)
+        np.testing.assert_equal(x, [1.5, 1, 1.5])  # without X and Y: from info
+        np.testing.assert_equal(y, [-2, 0, 3])
+
+
+class TestOpusAssembly(unittest.TestCase):
+
+    def test_image(self):
+        data_3D = np.arange(2 * 3 * 4.).reshape(2, 3, 4)
+        y_data, coords = _opus_image(data_3D, np.array([10., 11, 12]), np.array([5., 6]))
+        np.testing.assert_equal(y_data, np.vstack(data_3D))
+        self.assertTrue(np.shares_memory(y_data, data_3D))
+        np.testing.assert_equal(coords, [[10, 5], [11, 5], [12, 5],
+                                         [10, 6], [11, 6], [12, 6]])
+
+    def test_regions(self):
+        class Region:
+            def __init__(self, n, title):
+                self.spectra = np.full((n, 4), n, dtype=float)
+                self.mapX, self.mapY = np.arange(n), -np.arange(n)
+                self.title = title
+                self.start_time = np.zeros(n)
+        y_data, metas = _opus_regions([Region(2, "a"), Region(1, "b")], start_time=False)
+        np.testing.assert_equal(y_data[:, 0], [2, 2, 1])
+        self.assertEqual(metas.tolist(), [[0, 0, "a"], [1, -1, "a"], [0, 0, "b"]])
+        _, metas = _opus_regions([Region(2, "a")], start_time=True)
+        self.assertEqual(metas.shape, (2, 4))
+
+
 class TestGSF(unittest.TestCase):
 
     def test_open_line(self):
@@ -155,7 +384,40 @@ class TestNea(unittest.TestCase):
     def test_open(self):
         data = Orange.data.Table(spectra20nea())
         self.assertEqual(len(data), 12)
-        # FIXME check contents
+
+    def test_contents(self):
+        # two pixels with two runs each; the second run has a stretched M axis,
+        # so its O values are interpolated to the common X = [0, 1, 2]
+        lines = []
+        for row, column in [(1, 0), (0, 5)]:
+            for run, M in [(0, [0, 1, 2]), (1, [0, 2, 4])]:
+                lines.append([row, column, run, "M"] + M)
+                for i, channel in enumerate(["O0A", "O1A", "O0P", "O1P"]):
+                    v = 100 * row + 10 * i + run
+                    lines.append([row, column, run, channel] + [v + m for m in M])
+        rs = np.random.RandomState(0)
+        content = "Row\tColumn\tRun\tChannel\tData\n" + "".join(
+            "\t".join(str(e) for e in lines[i]) + "\n" for i in rs.permutation(len(lines)))
+        with named_file(content, suffix=".nea") as fn:
+            data = NeaReader(fn).read()
+        np.testing.assert_equal(getx(data), [0, 1, 2])
+        # pixels are sorted by row and column, channels by type and harmonic
+        self.assertEqual([list(m) for m in data.metas],
+                         [[0, 5, "O0A"], [0, 5, "O1A"], [0, 5, "O0P"], [0, 5, "O1P"],
+                          [1, 0, "O0A"], [1, 0, "O1A"], [1, 0, "O0P"], [1, 0, "O1P"]])
+        # the mean of runs 0 (v + x) and 1 (v + 1 + x)
+        expected = [[100 * row + 10 * i + 0.5 + x for x in [0, 1, 2]]
+                    for row in [0, 1] for i in range(4)]
+        np.testing.assert_allclose(data.X, expected)
+
+    def test_interp_rows(self):
+        rng = np.random.RandomState(0)
+        xp = rng.rand(5, 20)
+        fp = rng.rand(5, 3, 20)
+        x = np.linspace(np.max(np.min(xp, axis=1)), np.min(np.max(xp, axis=1)), 10)
+        res = _interp_rows(xp, fp, x)
+        for i in range(5):
+            np.testing.assert_allclose(res[i], interp1d(xp[i], fp[i])(x))
 
 
 class TestSpa(unittest.TestCase):
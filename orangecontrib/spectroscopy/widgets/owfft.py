@@ -242,61 +242,50 @@ class OWFFT(OWWidget):
         self.error(2)   # vsplit ValueError, odd number of data points
         self.warning(4) # Phase resolution limit too low
 
-        for row in self.data.X:
-            # Check to see if interferogram is single or double sweep
-            if self.sweeps == 0:
-                try:
-                    spectrum_out, phase_out, self.wavenumbers = self.fft_single(row)
-                except ValueError as e:
-                    self.error(1, "FFT error: %s" % e)
-                    return
-
-            elif self.sweeps == 1:
-                # Double sweep interferogram is split, solved independently and the
-                # two results are averaged.
-                try:
-                    data = np.hsplit(row, 2)
-                except ValueError as e:
-                    self.error(2, "%s" % e)
-                    return
-
-                fwd = data[0]
-                # Reverse backward sweep to match fwd sweep
-                back = data[1][::-1]
-
-                # Calculate spectrum for both forward and backward sweeps
-                try:
-                    spectrum_fwd, phase_fwd, self.wavenumbers = self.fft_single(fwd)
-                    spectrum_back, phase_back, self.wavenumbers = self.fft_single(back)
-                except ValueError as e:
-                    self.error(1, "FFT error: %s" % e)
-                    return
-
-                # Calculate the average of the forward and backward sweeps
-                spectrum_out = np.mean( np.array([spectrum_fwd, spectrum_back]), axis=0)
-                phase_out = np.mean(np.array([phase_fwd, phase_back]), axis=0)
+        fft = self.irfft()
 
-            else:
+        # Check to see if interferogram is single or double sweep
+        if self.sweeps == 0:
+            try:
+                self.spectra, self.phases, self.wavenumbers = fft(self.data.X)
+            except ValueError as e:
+                self.error(1, "FFT error: %s" % e)
                 return
 
-            if self.spectra is not None:
-                self.spectra = np.vstack((self.spectra, spectrum_out))
-                self.phases = np.vstack((self.phases, phase_out))
-            else:
-                self.spectra = spectrum_out
-                self.phases = phase_out
+        elif self.sweeps == 1:
+            # Double sweep interferogram is split, solved independently and the
+            # two results are averaged.
+            try:
+                data = np.hsplit(self.data.X, 2)
+            except ValueError as e:
+                self.error(2, "%s" % e)
+                return
+
+            fwd = data[0]
+            # Reverse backward sweep to match fwd sweep
+            back = data[1][:, ::-1]
+
+            # Calculate spectrum for both forward and backward sweeps
+            try:
+                spectrum_fwd, phase_fwd, self.wavenumbers = fft(fwd)
+                spectrum_back, phase_back, self.wavenumbers = fft(back)
+            except ValueError as e:
+                self.error(1, "FFT error: %s" % e)
+                return
+
+            # Calculate the average of the forward and backward sweeps
+            self.spectra = (spectrum_fwd + spectrum_back) / 2
+            self.phases = (phase_fwd + phase_back) / 2
+
+        else:
+            return
 
         if self.limit_output is True:
             limits = np.searchsorted(self.wavenumbers,
                                      [self.out_limit1, self.out_limit2])
             self.wavenumbers = self.wavenumbers[limits[0]:limits[1]]
-            # Handle 1D array if necessary
-            if self.spectra.ndim == 1:
-                self.spectra = self.spectra[None,limits[0]:limits[1]]
-                self.phases = self.phases[None,limits[0]:limits[1]]
-            else:
-                self.spectra = self.spectra[:,limits[0]:limits[1]]
-                self.phases = self.phases[:,limits[0]:limits[1]]
+            self.spectra = self.spectra[:,limits[0]:limits[1]]
+            self.phases = self.phases[:,limits[0]:limits[1]]
 
         self.spectra_table = build_spec_table(self.wavenumbers, self.spectra)
         self.phases_table = build_spec_table(self.wavenumbers, self.phases)
@@ -336,27 +325,17 @@ class OWFFT(OWWidget):
                 # single, asymetric
                 self.sweeps = 0
 
-    def fft_single(self, Ix):
+    def irfft(self):
         """
-        Handle FFT options and call irfft.fft_single_sweep.
-
-        Args:
-            Ix (np.array): 1D array with a single-sweep interferogram
-
-        Returns:
-            spectrum: 1D array of frequency domain amplitude intensities
-            phase: 1D array of frequency domain phase intensities
-            wavenumbers: 1D array of corresponding wavenumber set
+        Handle FFT options and return an irfft.IRFFT for all interferograms.
         """
         if self.phase_res_limit is True:
             phase_res = self.phase_resolution
         else:
             phase_res = None
 
-        spectrum, phase, wavenumbers = irfft.fft_single_sweep(Ix, self.dx,
-                                        phase_res, self.apod_func, self.zff)
-
-        return spectrum, phase, wavenumbers
+        return irfft.IRFFT(self.dx, apod_func=self.apod_func, zff=self.zff,
+                           phase_res=phase_res)
 
 # Simple main stub function in case being run outside Orange Canvas
 def main(argv=sys.argv):
@@ -1,9 +1,12 @@
 import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from functools import reduce
-from itertools import chain, repeat
 from collections import Counter
 
-from AnyQt.QtCore import Qt
+from AnyQt.QtCore import Qt, pyqtSlot as Slot
 from AnyQt.QtWidgets import QSizePolicy as Policy, QGridLayout, QLabel, QMessageBox, QFileDialog, QApplication, QStyle,\
     QListWidget
 import numpy as np
@@ -15,8 +18,8 @@ from Orange.data.io import FileFormat
 from Orange.widgets import widget, gui
 import Orange.widgets.data.owfile
 from Orange.widgets.utils.domaineditor import DomainEditor
+from Orange.widgets.utils.concurrent import FutureSetWatcher
 from Orange.widgets.utils.filedialogs import RecentPathsWidgetMixin, RecentPath, dialog_formats
-from warnings import catch_warnings
 
 
 def unique(seq):
@@ -72,39 +75,123 @@ def domain_union_for_spectra(tables):
 
 
 def concatenate_data(tables, filenames, label):
+    """ Concatenate Tables and spectral (xs, vals, additional) triples
+    into a preallocated table with the union of their domains. """
     domain, xs = domain_union_for_spectra(tables)
-    ntables = [(table if isinstance(table, Orange.data.Table) else table[2]).transform(domain)
-              for table in tables]
-    data = type(ntables[0]).concatenate(ntables, axis=0)
     source_var = Orange.data.StringVariable.make("Filename")
     label_var = Orange.data.StringVariable.make("Label")
 
-    # add other variables
     xs_atts = tuple([Orange.data.ContinuousVariable.make("%f" % f) for f in xs])
-    domain = Orange.data.Domain(xs_atts + domain.attributes, domain.class_vars,
-                                domain.metas + (source_var, label_var))
-    data = data.transform(domain)
+    out_domain = Orange.data.Domain(xs_atts + domain.attributes, domain.class_vars,
+                                    domain.metas + (source_var, label_var))
+
+    tables = [(table if isinstance(table, Orange.data.Table) else table[2], table)
+              for table in tables]
+    n = sum(len(t) for t, _ in tables)
+    X = np.full((n, len(out_domain.attributes)), np.nan)
+    Y = np.full((n, len(out_domain.class_vars)), np.nan)
+    metas = np.empty((n, len(out_domain.metas)), dtype=object)
 
-    #fill in spectral data
     xs_sind = np.argsort(xs)
     xs_sorted = xs[xs_sind]
     pos = 0
-    for table in tables:
-        t = table if isinstance(table, Orange.data.Table) else table[2]
+    for (t, table), fn in zip(tables, filenames):
+        rows = slice(pos, pos + len(t))
+        # non-spectral variables: a transformation matches values of variables
+        nt = t.transform(domain)
+        X[rows, len(xs):] = nt.X
+        if Y.shape[1]:
+            Y[rows] = nt.Y.reshape(len(nt), -1)
+        metas[rows, :-2] = nt.metas
+        metas[rows, -2] = fn
+        metas[rows, -1] = label
         if not isinstance(table, Orange.data.Table):
             indices = xs_sind[np.searchsorted(xs_sorted, table[0])]
-            data.X[pos:pos+len(t), indices] = table[1]
+            X[rows, indices] = table[1]
         pos += len(t)
 
-    data[:, source_var] = np.array(list(
-        chain(*(repeat(fn, len(table))
-                for fn, table in zip(filenames, ntables)))
-    )).reshape(-1, 1)
-    data[:, label_var] = np.array(list(
-        chain(*(repeat(label, len(table))
-                for fn, table in zip(filenames, ntables)))
-    )).reshape(-1, 1)
-    return data
+    return Orange.data.Table.from_numpy(out_domain, X, Y, metas)
+
+
+_recording = threading.local()
+_recording_count = 0
+_showwarning = None
+
+
+def _record_showwarning(message, category, filename, lineno, file=None, line=None):
+    log = getattr(_recording, "log", None)
+    if log is None:
+        _showwarning(message, category, filename, lineno, file, line)
+    else:
+        log.append(warnings.WarningMessage(message, category, filename, lineno, file, line))
+
+
+def start_recording_warnings():
+    """ Route warnings into the logs of record_warnings. Only call it
+    (and stop_recording_warnings) from the GUI thread. """
+    global _recording_count, _showwarning
+    if _recording_count == 0:
+        _showwarning = warnings.showwarning
+        warnings.showwarning = _record_showwarning
+    _recording_count += 1
+
+
+def stop_recording_warnings():
+    global _recording_count
+    _recording_count -= 1
+    if _recording_count == 0 and warnings.showwarning is _record_showwarning:
+        warnings.showwarning = _showwarning
+
+
+@contextmanager
+def record_warnings():
+    """ Record warnings issued in the current thread while recording is
+    started; other warnings are shown as usual. """
+    _recording.log = log = []
+    try:
+        yield log
+    finally:
+        del _recording.log
+
+
+def read_file(fn, sheet=None):
+    """ Read a file into a Table or, for spectral formats,
+    into a (xs, vals, additional) triple.
+
+    Return the result and a list of warnings issued while reading. """
+    with record_warnings() as log:
+        reader = FileFormat.get_reader(fn)
+        if sheet in reader.sheets:
+            reader.select_sheet(sheet)
+        if isinstance(reader, SpectralFileFormat):
+            xs, vals, additional = reader.read_spectra()
+            if additional is None:
+                empty_domain = Orange.data.Domain(attributes=[])
+                additional = Orange.data.Table.from_domain(empty_domain, n_rows=len(vals))
+            result = xs, vals, additional
+        else:
+            result = reader.read()
+    return result, log
+
+
+def file_key(fn, sheet):
+    """ Files with unchanged keys do not need to be read again """
+    try:
+        return os.path.getmtime(fn), sheet
+    except OSError:
+        return None
+
+
+class _Loading:
+    """ Files being read in a thread pool """
+
+    def __init__(self, fns, keys, todo, executor, futures, watcher):
+        self.fns = fns  # all files of the output
+        self.keys = keys
+        self.todo = todo  # files being read
+        self.executor = executor
+        self.futures = futures
+        self.watcher = watcher
 
 
 class OWMultifile(Orange.widgets.data.owfile.OWFile, RecentPathsWidgetMixin):
@@ -123,6 +210,9 @@ class OWMultifile(Orange.widgets.data.owfile.OWFile, RecentPathsWidgetMixin):
     label = Orange.widgets.settings.Setting("")
     recent_paths = Orange.widgets.settings.Setting([])
 
+    class Information(Orange.widgets.data.owfile.OWFile.Information):
+        cancelled = widget.Msg("Loading was cancelled.")
+
     def __init__(self):
         widget.OWWidget.__init__(self)
         RecentPathsWidgetMixin.__init__(self)
@@ -130,6 +220,8 @@ class OWMultifile(Orange.widgets.data.owfile.OWFile, RecentPathsWidgetMixin):
         self.data = None
         self.loaded_file = ""
         self.sheets = []
+        self._loaded = {}  # filename -> (file_key, read_file result, warnings)
+        self._loading = None
 
         self.lb = gui.listBox(self.controlArea, self, "file_idx",
                               selectionMode=QListWidget.MultiSelection)
@@ -160,6 +252,11 @@ class OWMultifile(Orange.widgets.data.owfile.OWFile, RecentPathsWidgetMixin):
         reload_button.setSizePolicy(Policy.Fixed, Policy.Fixed)
         layout.addWidget(reload_button, 0, 7)
 
+        self.cancel_button = gui.button(
+            None, self, "Cancel", callback=self.cancel_loading, autoDefault=False)
+        self.cancel_button.setEnabled(False)
+        layout.addWidget(self.cancel_button, 0, 8)
+
         self.sheet_box = gui.hBox(None, addToLayout=False, margin=0)
         self.sheet_combo = gui.comboBox(None, self, "xls_sheet",
                                         callback=self.select_sheet,
@@ -302,36 +399,86 @@ class OWMultifile(Orange.widgets.data.owfile.OWFile, RecentPathsWidgetMixin):
     def current_filenames(self):
         return [rp.abspath for rp in self.recent_paths]
 
+    def cancel_loading(self):
+        if self._stop_loading():
+            self.Information.cancelled()
+
+    def _stop_loading(self):
+        """ Stop the current loading without waiting for the reads in
+        progress (their results are discarded).
+
+        Return True if there was a loading to stop.
+        """
+        if self._loading is None:
+            return False
+        loading, self._loading = self._loading, None
+        loading.watcher.doneAll.disconnect(self._loading_finished)
+        loading.watcher.progressChanged.disconnect(self._loading_progress)
+        for f in loading.futures:
+            f.cancel()
+        loading.executor.shutdown(wait=False)
+        self._loading_stopped()
+        return True
+
+    def _loading_stopped(self):
+        stop_recording_warnings()
+        self.cancel_button.setEnabled(False)
+        self.progressBarFinished()
+        self.setBlocking(False)
+
+    @Slot(int, int)
+    def _loading_progress(self, n, d):
+        self.progressBarSet(100 * n / d)
+
+    @Slot()
+    def _loading_finished(self):
+        loading, self._loading = self._loading, None
+        self._loading_stopped()
+        loading.executor.shutdown(wait=False)
+        for fn, future in zip(loading.todo, loading.futures):
+            try:
+                result, log = future.result()
+            except Exception:  # pylint: disable=broad-except
+                self._loaded.pop(fn, None)  # FIXME show error in the list of data
+            else:
+                self._loaded[fn] = loading.keys[fn], result, log
+        self._send_loaded(loading.fns)
+
     def load_data(self):
-        self.closeContext()
+        """ Read files in parallel threads; results of unchanged files
+        are reused. The data is sent when all the files are read. """
+        self._stop_loading()  # a newer loading replaces it
+        self.Information.cancelled.clear()
 
         fns = self.current_filenames()
+        keys = {fn: file_key(fn, self.sheet) for fn in fns}
+        # only keep files that are still in the list
+        self._loaded = {fn: self._loaded[fn] for fn in fns if fn in self._loaded}
+        todo = [fn for fn in fns
+                if keys[fn] is None or self._loaded.get(fn, (None,))[0] != keys[fn]]
+        if not todo:
+            self._send_loaded(fns)
+            return
+
+        start_recording_warnings()
+        executor = ThreadPoolExecutor(max_workers=min(len(todo), os.cpu_count() or 1))
+        futures = [executor.submit(read_file, fn, self.sheet) for fn in todo]
+        watcher = FutureSetWatcher(futures)
+        watcher.doneAll.connect(self._loading_finished)
+        watcher.progressChanged.connect(self._loading_progress)
+        self._loading = _Loading(fns, keys, todo, executor, futures, watcher)
+        self.progressBarInit()
+        self.cancel_button.setEnabled(True)
+        self.setBlocking(True)
+
+    def _send_loaded(self, fns):
+        self.closeContext()
 
-        data_list = []
-        fnok_list = []
-
-        empty_domain = Orange.data.Domain(attributes=[])
-        for fn in fns:
-            reader = FileFormat.get_reader(fn)
-            errors = []
-            with catch_warnings(record=True) as warnings:
-                try:
-                    if self.sheet in reader.sheets:
-                        reader.select_sheet(self.sheet)
-                    if isinstance(reader, SpectralFileFormat):
-                        xs, vals, additional = reader.read_spectra()
-                        if additional is None:
-                            additional = Orange.data.Table.from_domain(empty_domain, n_rows=len(vals))
-                        data_list.append((xs, vals, additional))
-                    else:
-                        data_list.append(reader.read())
-                    fnok_list.append(fn)
-                except Exception as ex:
-                    errors.append("An error occurred:")
-                    errors.append(str(ex))
-                    #FIXME show error in the list of data
-                self.warning(warnings[-1].message.args[0] if warnings else '')
+        fnok_list = [fn for fn in fns if fn in self._loaded]
+        log = [w for fn in fnok_list for w in self._loaded[fn][2]]
+        self.warning(log[-1].message.args[0] if log else '')
 
+        data_list = [self._loaded[fn][1] for fn in fnok_list]
         if data_list:
             data = concatenate_data(data_list, fnok_list, self.label)
             self.data = data
@@ -342,6 +489,9 @@ class OWMultifile(Orange.widgets.data.owfile.OWFile, RecentPathsWidgetMixin):
 
         self.apply_domain_edit()  # sends data
 
+    def onDeleteWidget(self):
+        self._stop_loading()
+        super().onDeleteWidget()
 
 if __name__ == "__main__":
     import sys
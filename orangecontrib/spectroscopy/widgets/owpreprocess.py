@@ -37,7 +37,7 @@ from orangecontrib.spectroscopy.data import getx
 # baseline correction imports
 from orangecontrib.spectroscopy.preprocess import LinearBaseline, RubberbandBaseline
 
-from orangecontrib.spectroscopy.preprocess import CurveShift
+from orangecontrib.spectroscopy.preprocess import CurveShift, FusedPreprocessorList
 from orangecontrib.spectroscopy.preprocess import PCADenoising, GaussianSmoothing, Cut, SavitzkyGolayFiltering, \
      Normalize, Integrate, Absorbance, Transmittance
 from orangecontrib.spectroscopy.widgets.owspectra import CurvePlot
@@ -1612,7 +1612,7 @@ class OWPreprocess(OWWidget):
         if len(plist) == 1:
             return plist[0]
         else:
-            return preprocess.preprocess.PreprocessorList(plist)
+            return FusedPreprocessorList(plist)
 
     def apply(self):
         # Sync the model into storedsettings on every apply.
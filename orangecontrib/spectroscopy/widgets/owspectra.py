@@ -31,7 +31,7 @@ from Orange.widgets.utils.plot import \
 
 from Orange.widgets.visualize.owscatterplotgraph import HelpEventDelegate
 
-from orangecontrib.spectroscopy.data import getx
+from orangecontrib.spectroscopy.data import domain_x_axis
 from orangecontrib.spectroscopy.widgets.line_geometry import \
     distance_curves, intersect_curves_chunked
 from orangecontrib.spectroscopy.widgets.gui import lineEditFloatOrNone
@@ -1246,8 +1246,7 @@ class CurvePlot(QWidget, OWComponent, SelectionGroupMixin):
             self.restore_selection_settings()
 
             # get and sort input data
-            x = getx(self.data)
-            xsind = np.argsort(x)
+            x, xsind, _ = domain_x_axis(self.data.domain)
             self.data_x = x[xsind]
             self.data_xsind = xsind
             self._set_subset_indices()  # refresh subset indices according to the current subset